@@ -0,0 +1,354 @@
+"""预先计算每条赛道上每个技能可能发动的区间
+
+只看条件里和位置、赛道有关的项（阶段、弯道、直线、坡道、距离、距离类型、场地等），
+按逐米掩码求出每个分支的交集，再对各个分支（@）求并集。其它项（顺位、体力、随机等）
+无法静态判断，一律当作满足，所以结果是可能发动区间的上界：区间为空的技能在这条赛道上
+一定不会发动，图表可以在模拟前直接剔除。
+
+各项的语义和 simulator.worker.js 中的 Conditions 一致。
+"""
+
+import argparse
+import json
+import operator
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import artifacts
+import conditions
+import course_pack
+
+VERSION = 1
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">=": operator.ge,
+    "<=": operator.le,
+    ">": operator.gt,
+    "<": operator.lt,
+}
+
+
+class Course:
+    """一条赛道的逐米数组，用于计算各项的掩码"""
+
+    def __init__(self, pack: course_pack.CoursePack, course_id: str, track_id=None):
+        info = pack.courses[course_id]
+        self.info = info
+        self.distance = info["distance"]
+        self.n_corners = info["corners"]
+        self.meters = np.arange(self.distance + 1)
+        flags = np.frombuffer(pack.column("flags", course_id), dtype=np.uint8)
+        self.phase = flags >> course_pack.PHASE_SHIFT
+        self.in_corner = (flags & course_pack.CORNER) != 0
+        self.straight = (flags & course_pack.STRAIGHT) != 0
+        self.uphill = (flags & course_pack.UPHILL) != 0
+        self.downhill = (flags & course_pack.DOWNHILL) != 0
+        self.corner = np.frombuffer(pack.column("corner", course_id), dtype=np.uint8)
+        self.bounds = pack.phase_bounds(course_id) + [self.distance]
+        self.track_id = track_id
+
+    def full(self, value=True) -> np.ndarray:
+        return np.full(len(self.meters), value)
+
+    def between(self, start, end) -> np.ndarray:
+        return (self.meters >= start) & (self.meters < end)
+
+    def corner_number(self) -> np.ndarray:
+        """每米所在弯道的编号（1-4，最终弯道为 4，往前依次递减并循环），不在弯道为 0"""
+        index = self.corner.astype(np.int64) - 1
+        return np.where(self.corner > 0, (index - self.n_corners) % 4 + 1, 0)
+
+    def final_corner(self):
+        """最终弯道的 (起点, 终点)，没有弯道时为 None"""
+        hits = np.flatnonzero(self.corner == self.n_corners) if self.n_corners else []
+        if len(hits) == 0:
+            return None
+        return hits[0], hits[-1] + 1
+
+    def last_straight(self):
+        hits = np.flatnonzero(self.straight)
+        if len(hits) == 0:
+            return None
+        gaps = np.flatnonzero(np.diff(hits) > 1)
+        start = hits[gaps[-1] + 1] if len(gaps) else hits[0]
+        return start, hits[-1] + 1
+
+    def phase_range(self, phase):
+        return self.bounds[phase], self.bounds[phase + 1]
+
+
+def _flag(mask: np.ndarray, op: str, value: int) -> np.ndarray | None:
+    """状态类的项（==1 / ==0 / !=0 / !=1），其它写法无法判断时返回 None"""
+    if (op, value) in (("==", 1), ("!=", 0)):
+        return mask
+    if (op, value) in (("==", 0), ("!=", 1)):
+        return ~mask
+    return None
+
+
+def _random(mask: np.ndarray, op: str, value: int) -> np.ndarray | None:
+    """随机类的项只有 ==1 表示“在这些位置中随机选一点”，其它写法无法判断时返回 None"""
+    return mask if (op, value) == ("==", 1) else None
+
+
+def _final_corner_mask(course: Course, term):
+    final = course.final_corner()
+    if final is None:
+        mask = course.full(False)
+    else:
+        start, end = final
+        if term.name == "is_finalcorner":
+            # 进入最终弯道之后一直为真
+            mask = course.between(start, course.distance + 1)
+        elif term.name == "is_finalcorner_laterhalf":
+            mask = course.between((start + end) / 2, end)
+        else:
+            mask = course.between(start, end)
+    if term.name == "is_finalcorner_random":
+        return _random(mask, term.op, term.value)
+    return _flag(mask, term.op, term.value)
+
+
+def _phase_mask(course: Course, term):
+    start, end = course.phase_range(term.value)
+    if term.name == "phase_random":
+        return course.between(start, end)
+    if term.name == "phase_firsthalf_random":
+        return course.between(start, start + (end - start) / 2)
+    if term.name == "phase_laterhalf_random":
+        return course.between((start + end) / 2, end)
+    if term.name in ("phase_firstquarter", "phase_firstquarter_random"):
+        return course.between(start, start + (end - start) / 4)
+    if term.name == "phase_corner_random":
+        return course.between(start, end) & course.in_corner
+    return course.between(start, end) & course.straight  # phase_straight_random
+
+
+def _slope_mask(course: Course, value):
+    if value == 1:
+        return course.uphill
+    if value == 2:
+        return course.downhill
+    return ~(course.uphill | course.downhill)
+
+
+def term_mask(course: Course, term) -> np.ndarray | None:
+    """一项的逐米掩码；和位置、赛道无关的项返回 None"""
+    name, op, value = term
+    compare = OPERATORS[op]
+
+    if name == "phase":
+        return compare(course.phase, value)
+    if name in (
+        "phase_random",
+        "phase_firsthalf_random",
+        "phase_laterhalf_random",
+        "phase_firstquarter",
+        "phase_firstquarter_random",
+        "phase_corner_random",
+        "phase_straight_random",
+    ):
+        # 值为阶段编号（0-3）
+        return _phase_mask(course, term) if op == "==" and 0 <= value <= 3 else None
+    if name == "corner":
+        if op == "==":
+            return ~course.in_corner if value == 0 else course.corner_number() == value
+        if op == "!=" and value == 0:
+            return course.in_corner
+        return None
+    if name == "all_corner_random":
+        return _random(course.in_corner, op, value)
+    if name == "corner_random":
+        # 值为弯道编号（1-4），和 corner 的编号方式相同
+        return course.corner_number() == value if op == "==" and 1 <= value <= 4 else None
+    if name in ("is_finalcorner", "is_finalcorner_laterhalf", "is_finalcorner_random"):
+        return _final_corner_mask(course, term)
+    if name == "straight_random":
+        return _random(course.straight, op, value)
+    if name in ("is_last_straight", "is_last_straight_onetime"):
+        last = course.last_straight()
+        if last is None:
+            mask = course.full(False)
+        else:
+            start, end = last
+            if name == "is_last_straight_onetime":
+                end = start + 10
+            mask = course.between(start, end)
+        if name == "is_last_straight_onetime":
+            # 只在进入最后直线时判断一次，==0 没有明确的位置
+            return _random(mask, op, value)
+        return _flag(mask, op, value)
+    if name == "slope" and op == "==":
+        return _slope_mask(course, value)
+    if name == "up_slope_random":
+        return _random(course.uphill, op, value)
+    if name == "down_slope_random":
+        return _random(course.downhill, op, value)
+    if name == "is_lastspurt":
+        return _flag(course.between(course.bounds[2], course.distance + 1), op, value)
+    if name == "distance_rate":
+        return compare(course.meters, course.distance * value / 100)
+    if name == "distance_rate_after_random" and op == "==":
+        return course.meters >= course.distance * value / 100
+    if name == "remain_distance":
+        return compare(course.distance - course.meters, value)
+
+    # 整条赛道统一的项
+    if name == "distance_type":
+        return course.full(bool(compare(course.info["distanceType"], value)))
+    if name == "ground_type":
+        return course.full(bool(compare(course.info["surface"], value)))
+    if name == "rotation":
+        return course.full(bool(compare(course.info["turn"], value)))
+    if name == "course_distance":
+        return course.full(bool(compare(course.distance, value)))
+    if name == "corner_count":
+        return course.full(bool(compare(course.n_corners, value)))
+    if name == "is_basis_distance" and op == "==":
+        return course.full(min(course.distance % 400, 1) != value)
+    if name == "track_id" and course.track_id is not None:
+        return course.full(bool(compare(course.track_id, value)))
+    return None
+
+
+def condition_mask(course: Course, condition) -> np.ndarray | None:
+    """各分支掩码的并集；条件里没有任何可判断的项时返回 None"""
+    result = None
+    for branch in condition:
+        mask = None
+        for term in branch:
+            m = term_mask(course, term)
+            if m is not None:
+                mask = m if mask is None else mask & m
+        if mask is None:
+            # 这个分支在任何位置都可能满足
+            return None
+        result = mask if result is None else result | mask
+    return result
+
+
+def intervals(mask: np.ndarray) -> list[list[int]]:
+    """掩码中连续为真的 [起点, 终点) 区间"""
+    edges = np.diff(np.r_[0, mask.astype(np.int8), 0])
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return [[int(a), int(b)] for a, b in zip(starts, ends)]
+
+
+# 子进程中的共享数据，由 _init 设置
+_pack = None
+_skills = None
+_tracks = None
+
+
+def _init(pack_path, skills, tracks):
+    global _pack, _skills, _tracks
+    _pack = course_pack.CoursePack(pack_path)
+    _skills = skills
+    _tracks = tracks
+
+
+def evaluate_course(course_id: str) -> tuple[str, dict]:
+    """返回 (course_id, {"never": [...], "spans": [...], "regions": {技能: 区间编号}})
+
+    never 为在这条赛道上不可能发动的技能；regions 只列出发动位置受限制的技能，
+    值为 spans 中的下标（很多技能的区间相同，只保存一次），每项是若干 [起点, 终点) 区间。
+    没有出现的技能在整条赛道上都可能发动。
+    """
+    course = Course(_pack, course_id, _tracks.get(course_id))
+    never, spans, regions = [], {}, {}
+    for skill_id, alternatives in _skills:
+        union = None
+        unrestricted = False
+        for condition, precondition in alternatives:
+            pre = condition_mask(course, precondition)
+            if pre is not None and not pre.any():
+                continue
+            mask = condition_mask(course, condition)
+            if mask is None:
+                unrestricted = True
+                break
+            union = mask if union is None else union | mask
+        if unrestricted:
+            continue
+        # 最后一个点是终点，不算在区间内
+        union = union[: course.distance] if union is not None else None
+        if union is None or not union.any():
+            never.append(skill_id)
+        elif not union.all():
+            key = tuple(map(tuple, intervals(union)))
+            regions[skill_id] = spans.setdefault(key, len(spans))
+    return course_id, {
+        "never": never,
+        "spans": [list(map(list, key)) for key in spans],
+        "regions": regions,
+    }
+
+
+def compile_skills(skill_data: dict) -> list:
+    """[(技能 id, [(条件 AST, 前置条件 AST), ...]), ...]，无法解析的条件当作没有限制"""
+    result = []
+    for skill_id, skill in skill_data.items():
+        alternatives = []
+        for alt in skill["alternatives"]:
+            try:
+                condition = conditions.parse(alt.get("condition") or "", strict=False)
+                precondition = conditions.parse(alt.get("precondition") or "", strict=False)
+            except conditions.ConditionError as e:
+                print(f"[Warning] {skill_id}: {e}")
+                condition, precondition = (), ()
+            alternatives.append((condition or ((),), precondition))
+        result.append((skill_id, alternatives))
+    return result
+
+
+def compute(skill_data: dict, course_data: dict, pack_path: str, workers=None) -> dict:
+    skills = compile_skills(skill_data)
+    tracks = {cid: c.get("raceTrackId") for cid, c in course_data.items()}
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init, initargs=(pack_path, skills, tracks)
+    ) as pool:
+        courses = dict(pool.map(evaluate_course, course_data, chunksize=4))
+    return {"version": VERSION, "courses": courses}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="计算每条赛道上技能可能发动的区间")
+    parser.add_argument("--skills", default="umalator-cn/skill_data.json")
+    parser.add_argument("--courses", default="umalator-cn/course_data.json")
+    parser.add_argument(
+        "--pack", default="course_data.pack", help="不存在时临时生成，比 --courses 旧或赛道不一致时重新生成"
+    )
+    parser.add_argument("--output", default="umalator-cn/activation.json")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="进程数，默认为 CPU 数")
+    args = parser.parse_args()
+
+    with open(args.skills, "r", encoding="utf-8") as f:
+        skill_data = json.load(f)
+    with open(args.courses, "r", encoding="utf-8") as f:
+        course_data = json.load(f)
+
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        pack_path = args.pack
+        if not os.path.exists(pack_path):
+            pack_path = os.path.join(tmp, "course_data.pack")
+            course_pack.write_pack(course_data, pack_path)
+        elif not course_pack.is_current(pack_path, course_data, args.courses):
+            print(f"[INFO] {pack_path} 和 {args.courses} 不一致，重新生成")
+            course_pack.write_pack(course_data, pack_path)
+        result = compute(skill_data, course_data, pack_path, args.workers)
+    artifacts.emit(result, args.output)
+
+    never = sum(len(c["never"]) for c in result["courses"].values())
+    restricted = sum(len(c["regions"]) for c in result["courses"].values())
+    print(
+        f"{len(course_data)} 条赛道 × {len(skill_data)} 个技能：{never} 组不可能发动，"
+        f"{restricted} 组有位置限制，耗时 {time.perf_counter() - start:.2f}s"
+    )
@@ -0,0 +1,168 @@
+"""生成 umalator-cn 使用的数据文件
+
+写出去掉空白、键顺序固定的 JSON，并在旁边生成预压缩的 .gz / .br（安装了 brotli 时），
+另外保存一份带内容哈希的文件名（如 skill_data.1a2b3c4d5e.json），记录在 manifest.json 中，
+静态站点可以对带哈希的文件设置永久缓存，数据变化时只需重新下载变化的文件。
+"""
+
+import argparse
+import contextlib
+import gzip
+import hashlib
+import json
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+MANIFEST = "manifest.json"
+HASH_LENGTH = 10
+
+
+def encode(data, sort_keys=True) -> bytes:
+    """最小化的 JSON，键按字典序排列，相同数据总是得到相同字节"""
+    return json.dumps(
+        data, ensure_ascii=False, sort_keys=sort_keys, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def compress(body: bytes) -> dict[str, bytes]:
+    """预压缩的各个版本；gzip 的 mtime 固定为 0，输出可复现"""
+    result = {"gz": gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        result["br"] = brotli.compress(body, quality=11)
+    return result
+
+
+def hashed_name(path: str, body: bytes) -> str:
+    stem, ext = os.path.splitext(os.path.basename(path))
+    digest = hashlib.sha256(body).hexdigest()[:HASH_LENGTH]
+    return f"{stem}.{digest}{ext}"
+
+
+def write_bytes(path: str, body: bytes):
+    """内容没变时不重写，保留修改时间"""
+    if os.path.exists(path) and os.path.getsize(path) == len(body):
+        with open(path, "rb") as f:
+            if f.read() == body:
+                return
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(body)
+    os.replace(tmp, path)
+
+
+@contextlib.contextmanager
+def _locked(path: str):
+    """多个脚本可能同时更新 manifest（build.py 并行运行），用文件锁串行化
+
+    释放前删除锁文件，不在输出目录中留下 .lock。拿到锁后要确认锁住的还是路径上现在的文件：
+    等锁期间上一个持有者可能已经把它删除，别的进程又新建了一个，这时重新打开再锁。
+    """
+    lock_path = path + ".lock"
+    if fcntl is None:
+        yield
+        return
+    while True:
+        lock = open(lock_path, "a")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            current = os.path.samestat(os.fstat(lock.fileno()), os.stat(lock_path))
+        except FileNotFoundError:
+            current = False
+        if current:
+            break
+        lock.close()
+    try:
+        yield
+    finally:
+        os.remove(lock_path)
+        lock.close()
+
+
+def _update_manifest(directory: str, name: str, entry: dict):
+    path = os.path.join(directory, MANIFEST)
+    with _locked(path):
+        manifest = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        old = manifest.get(name)
+        manifest[name] = entry
+        text = json.dumps(manifest, ensure_ascii=False, indent=2, sort_keys=True)
+        write_bytes(path, text.encode("utf-8"))
+    return old
+
+
+def _remove_stale(directory: str, old: dict | None, entry: dict):
+    """删除上一版带哈希的文件"""
+    if old is None or old["file"] == entry["file"]:
+        return
+    for ext in ("", ".gz", ".br"):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(os.path.join(directory, old["file"] + ext))
+
+
+def emit(data, path: str, hashed=True, precompress=True, report=True) -> dict:
+    """把 data 写成 path，返回各版本的字节数
+
+    before 为以前 indent=4 写出的大小（只在 report 时计算，大文件上比编码本身还慢），
+    json 为最小化后的大小，gz / br 为压缩后的大小。
+    """
+    body = encode(data)
+    sizes = {"json": len(body)}
+    if report:
+        sizes["before"] = len(json.dumps(data, ensure_ascii=False, indent=4).encode("utf-8"))
+    write_bytes(path, body)
+
+    compressed = compress(body) if precompress else {}
+    for ext, blob in compressed.items():
+        write_bytes(f"{path}.{ext}", blob)
+        sizes[ext] = len(blob)
+
+    if hashed:
+        directory = os.path.dirname(path) or "."
+        name = hashed_name(path, body)
+        write_bytes(os.path.join(directory, name), body)
+        for ext, blob in compressed.items():
+            write_bytes(os.path.join(directory, f"{name}.{ext}"), blob)
+        entry = {
+            "file": name,
+            "sha256": hashlib.sha256(body).hexdigest(),
+            "bytes": sizes,
+        }
+        old = _update_manifest(directory, os.path.basename(path), entry)
+        _remove_stale(directory, old, entry)
+
+    if report:
+        print(format_report(path, sizes))
+    return sizes
+
+
+def format_report(path: str, sizes: dict) -> str:
+    before = sizes["before"]
+    parts = [f"{os.path.basename(path)}: {before:,} B"]
+    for key in ("json", "gz", "br"):
+        if key in sizes:
+            parts.append(f"{key} {sizes[key]:,} B ({sizes[key] / before:.1%})")
+    return " -> ".join(parts[:1]) + " -> " + ", ".join(parts[1:])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把已有的 JSON 文件重新按发布格式写出")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--no-hash", action="store_true", help="不生成带哈希的文件和 manifest")
+    parser.add_argument("--no-compress", action="store_true", help="不生成 .gz / .br")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        emit(data, path, hashed=not args.no_hash, precompress=not args.no_compress)
@@ -0,0 +1,532 @@
+import argparse
+import contextlib
+import copy
+import html
+import http.server
+import json
+import math
+import multiprocessing
+import os
+import platform
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from urllib.parse import unquote, urlsplit
+
+import lua_table
+from umas import GameDatabase
+
+NAME_LUA = "python/name.lua"
+COURSE_DATA = "course_data_normal.json"
+RETS = "rets.json"
+UPSTREAM = "other_merged.json"
+CUSTOM_PATCH = "custom_patch.json"
+FIXTURES = "python/fixtures"
+# 本机的基准，由 --save-baseline 记录，--baseline 不带路径时和它比较；耗时和机器有关，不提交
+BASELINE = ".bench_baseline.json"
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """注册一个基准测试，函数接收 repeat 并返回结果 dict"""
+
+    def decorator(fn):
+        BENCHMARKS[name] = fn
+        return fn
+
+    return decorator
+
+
+def measure(fn, repeat=5, items=None):
+    """运行 repeat 次取最快和平均耗时（秒），再单独运行一次用 tracemalloc 统计内存峰值
+
+    items 为每次处理的条目数，给出时计算吞吐量（条/秒）。
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    result = {"best": min(times), "mean": sum(times) / len(times), "peak_kb": peak / 1024}
+    if items:
+        result["items"] = items
+        result["throughput"] = items / result["best"]
+    return result
+
+
+def _load_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@benchmark("gamedb")
+def bench_gamedb(repeat):
+    """GameDatabase 冷启动（解析 name.lua）与热启动（读取预建索引）"""
+    with tempfile.TemporaryDirectory() as tmp:
+        index_path = os.path.join(tmp, "name.lua.idx")
+        cache_path = os.path.join(tmp, "name.json")
+
+        def cold():
+            if os.path.exists(index_path):
+                os.remove(index_path)
+            GameDatabase(NAME_LUA, cache_path, index_path)
+
+        def warm():
+            GameDatabase(NAME_LUA, cache_path, index_path)
+
+        return {"cold": measure(cold, repeat), "warm": measure(warm, repeat)}
+
+
+def _regex_records(path):
+    """旧版 GameDatabase 的逐行正则解析，作为 lua_table 的对照"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip(",\n ")
+            if not line or "{" not in line:
+                continue
+            pattern = re.compile(r'(\w+)=["\'](.*?)["\'](?=[,}])')
+            pairs = pattern.findall(line)
+            if pairs:
+                yield dict(pairs)
+
+
+@benchmark("lua_parser")
+def bench_lua_parser(repeat):
+    """name.lua 解析：旧的逐行正则 vs lua_table 流式解析"""
+
+    def streaming():
+        with open(NAME_LUA, "r", encoding="utf-8") as f:
+            for _ in lua_table.iter_records(f):
+                pass
+
+    def regex():
+        for _ in _regex_records(NAME_LUA):
+            pass
+
+    return {"regex": measure(regex, repeat), "streaming": measure(streaming, repeat)}
+
+
+def _synthetic_points(course_data):
+    """course_data_slope.json 的替代：每条赛道 1001 个高度点，按 id 生成的确定性起伏"""
+    points = {}
+    for course_id, course in course_data.items():
+        seed = int(course_id)
+        heights = [
+            0.03 * math.sin(i / (40 + seed % 17)) + 0.015 * math.sin(i / (7 + seed % 5))
+            for i in range(1001)
+        ]
+        track = points.setdefault(str(course["raceTrackId"]), {"courses": {}})
+        track["courses"][course_id] = {"slopes": heights}
+    return points
+
+
+@benchmark("slopes")
+def bench_slopes(repeat):
+    """slope.fill_course_slopes：course_data_normal.json 的全部赛道"""
+    import slope
+
+    course_data = _load_json(COURSE_DATA)
+    points = _synthetic_points(course_data)
+    meters = sum(int(c["distance"]) + 1 for c in course_data.values())
+
+    def run():
+        slope.fill_course_slopes(copy.deepcopy(course_data), points)
+
+    return {"fill_course_slopes": measure(run, repeat, items=meters)}
+
+
+@benchmark("merge")
+def bench_merge(repeat):
+    """merge.MergeEngine 全量合并 rets.json 和 other_merged.json，以及没有变化、只改了一个技能时的增量合并"""
+    import merge
+
+    rets, rets_digest = merge.load_with_digest(RETS)
+    other, other_digest = merge.load_with_digest(UPSTREAM)
+    patch, patch_digest = merge.load_with_digest(CUSTOM_PATCH)
+    digests = {"rets": rets_digest, "other": other_digest, "patch": patch_digest, "output": "out"}
+    # rets.json 中改动一个技能
+    edited = copy.deepcopy(rets)
+    key = next(iter(edited))
+    edited[key]["alternatives"][0]["baseDuration"] += 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+
+        def full():
+            merge.MergeEngine(os.path.join(tmp, "missing.json")).run(rets, other, patch)
+
+        engine = merge.MergeEngine(os.path.join(tmp, "state.json"))
+        previous, _ = engine.run(rets, other, patch, digests=digests)
+        engine.files["output"] = "out"
+        state, files = engine.state, engine.files
+
+        def incremental(data, changed):
+            engine.state, engine.files = state, dict(files)
+            engine.run(data, other, patch, previous=previous, digests={**digests, **changed})
+
+        return {
+            "full": measure(full, repeat, items=len(other)),
+            "incremental": measure(lambda: incremental(rets, {}), repeat, items=len(other)),
+            "incremental_one": measure(
+                lambda: incremental(edited, {"rets": "edited"}), repeat, items=len(other)
+            ),
+        }
+
+
+def _fixture(name):
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return f.read()
+
+
+@benchmark("skills_html")
+def bench_skills_html(repeat):
+    """skills.py 的页面解析：速查表的 div#jn-json 和技能详情页"""
+    import skills
+
+    listing = _fixture("listing.html")
+    pages = [_fixture(name) for name in sorted(os.listdir(FIXTURES)) if name.startswith("skill_")]
+    rows = len(skills.parse_listing(listing))
+
+    def parse_pages():
+        for page in pages:
+            skills.build_skill_json(*skills.parse_skill_page(page))
+
+    return {
+        "listing": measure(lambda: skills.parse_listing(listing), repeat, items=rows),
+        "skill_pages": measure(parse_pages, repeat, items=len(pages)),
+    }
+
+
+def _translation_page():
+    """翻译数据库页面的替代品：name.lua 放在 MediaWiki 模块页的 pre.mw-code 中，前后加上导航"""
+    with open(NAME_LUA, "r", encoding="utf-8") as f:
+        source = f.read()
+    return (
+        '<!DOCTYPE html><html><head><meta charset="UTF-8"><title>模块:翻译数据库</title></head><body>'
+        f'<ul class="nav">{PAGE_CHROME * 20}</ul><div id="mw-content-text">'
+        f'<pre class="mw-code mw-script" dir="ltr">{html.escape(source, quote=False)}</pre>'
+        f'</div><ul class="nav">{PAGE_CHROME * 20}</ul></body></html>'
+    ).encode("utf-8")
+
+
+EXTRACT_TARGETS = {
+    "listing": ("div", {"id": "jn-json"}),
+    "translation": ("pre", {"class": "mw-code mw-script", "dir": "ltr"}),
+}
+
+
+def _extract_bs4(content, target):
+    from bs4 import BeautifulSoup
+
+    tag, attrs = EXTRACT_TARGETS[target]
+    return BeautifulSoup(content, "html.parser").find(tag, attrs).get_text()
+
+
+def _extract_lxml(content, target):
+    import html_extract
+
+    tag, attrs = EXTRACT_TARGETS[target]
+    return html_extract.find_text(content, tag, attrs)
+
+
+EXTRACTORS = {"bs4": _extract_bs4, "lxml": _extract_lxml}
+
+
+def _reset_peak_rss():
+    """把进程的内存峰值（VmHWM）重置为当前值，只支持 Linux；不支持时返回 False"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_kb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return float(line.split()[1])
+    return None
+
+
+def _rss_growth(extractor, content, target):
+    # 在新进程中运行，内存峰值的增量包括 lxml 在 C 里分配的内存（tracemalloc 统计不到）
+    import bs4  # noqa: F401  先导入，不把模块本身算进去
+    import html_extract  # noqa: F401
+
+    if not _reset_peak_rss():
+        return None
+    before = _peak_rss_kb()
+    EXTRACTORS[extractor](content, target)
+    return _peak_rss_kb() - before
+
+
+@benchmark("extract")
+def bench_extract(repeat):
+    """速查表和翻译数据库页面取出目标元素文本：BeautifulSoup html.parser 与 lxml 流式解析"""
+    pages = {"listing": _fixture("listing.html"), "translation": _translation_page()}
+    results = {}
+    ctx = multiprocessing.get_context("spawn")
+    for target, content in pages.items():
+        texts = {name: fn(content, target) for name, fn in EXTRACTORS.items()}
+        if texts["bs4"] != texts["lxml"]:
+            raise AssertionError(f"{target}：两种方式取出的文本不同")
+        for name, fn in EXTRACTORS.items():
+            result = measure(lambda: fn(content, target), repeat, items=len(content) // 1024)
+            with ctx.Pool(1) as pool:
+                rss = pool.apply(_rss_growth, (name, content, target))
+            if rss is not None:
+                result["rss_kb"] = rss
+            results[f"{target}_{name}"] = result
+    return results
+
+
+EFFECT_NAMES = {
+    1: "被动（速度）",
+    2: "被动（耐力）",
+    3: "被动（力量）",
+    4: "被动（毅力）",
+    5: "被动（智力）",
+    9: "耐力恢复",
+    21: "妨害（速度）",
+    22: "即时速度",
+    27: "速度",
+    28: "横向速度",
+    31: "加速度",
+}
+
+PAGE_CHROME = "".join(
+    f'<li class="nav-item"><a href="/umamusume/page_{i}" title="page {i}">导航 {i}</a></li>'
+    for i in range(120)
+)
+
+
+def _skill_page(alternatives):
+    """按 wiki 技能页的结构生成详情页；多个 alternative 时用“条件N:”逐行列出"""
+
+    def field(values):
+        if len(values) == 1:
+            return values[0]
+        return "<br>".join(f"条件{i + 1}:{v}" for i, v in enumerate(values))
+
+    def duration(alt):
+        d = alt["baseDuration"]
+        return "始终" if d == -1 else "瞬时" if d == 0 else f"{d / 10000:g}"
+
+    rows = {
+        "触发代码": field([alt["condition"] for alt in alternatives]),
+        "技能类型": field(
+            ["、".join(EFFECT_NAMES[e["type"]] for e in alt["effects"]) for alt in alternatives]
+        ),
+        "技能数值": field(
+            ["、".join(f"{e['modifier'] / 10000:g}" for e in alt["effects"]) for alt in alternatives]
+        ),
+        "持续时间": field([duration(alt) for alt in alternatives]),
+    }
+    table = "".join(f"<tr><th>{k}</th><td>{v}</td></tr>" for k, v in rows.items())
+    return (
+        '<!DOCTYPE html><html><head><meta charset="UTF-8"><title>技能</title></head><body>'
+        f'<ul class="nav">{PAGE_CHROME}</ul>'
+        '<div id="mw-content-text"><div><div><div>'
+        f"<table><tbody>{table}</tbody></table>"
+        "</div></div></div></div>"
+        "</body></html>"
+    )
+
+
+def write_fixtures(pages=20):
+    """由 rets.json 生成 wiki 页面的替代品（真实页面需要联网下载）"""
+    rets = _load_json(RETS)
+    db = GameDatabase(NAME_LUA, "name.json")
+    os.makedirs(FIXTURES, exist_ok=True)
+
+    rows = []
+    for skill_id in rets:
+        name = db.get_name(category="47", index=skill_id)
+        prefix = "继承技/" if skill_id.startswith("9") else ""
+        rows.append({"1": f"简/{prefix}{name}", "2": skill_id, "3": name})
+    body = json.dumps(rows, ensure_ascii=False, indent=1)
+    # 和真实页面一样，数组最后多一个逗号
+    body = body[:-2] + ",\n]"
+    with open(os.path.join(FIXTURES, "listing.html"), "w", encoding="utf-8") as f:
+        f.write(
+            '<!DOCTYPE html><html><head><meta charset="UTF-8"></head><body>'
+            f'<ul class="nav">{PAGE_CHROME}</ul><div id="jn-json" style="display:none">{body}</div>'
+            "</body></html>"
+        )
+
+    written = 0
+    for skill_id, skill in rets.items():
+        alternatives = skill["alternatives"]
+        if not all(e["type"] in EFFECT_NAMES for alt in alternatives for e in alt["effects"]):
+            continue
+        with open(os.path.join(FIXTURES, f"skill_{skill_id}.html"), "w", encoding="utf-8") as f:
+            f.write(_skill_page(alternatives))
+        written += 1
+        if written >= pages:
+            break
+    print(f"已写入 {FIXTURES}：速查表 {len(rows)} 行，技能页面 {written} 个")
+
+
+class FixtureHandler(http.server.BaseHTTPRequestHandler):
+    """把 skills.py 请求的 wiki 地址映射到 fixtures 中的页面
+
+    base_url + LISTING_PAGE 对应 listing.html，base_url + quote("简/…") 对应速查表中这一行
+    的 skill_<id>.html，没有对应文件的页面返回 404。
+    """
+
+    def do_GET(self):
+        path = self.server.pages.get(unquote(urlsplit(self.path).path))
+        if path is None:
+            self.send_error(404)
+            return
+        with open(path, "rb") as f:
+            content = f.read()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=UTF-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def fixture_pages(fixtures=FIXTURES) -> dict:
+    """请求路径 -> fixtures 中的文件"""
+    import skills
+
+    listing = os.path.join(fixtures, "listing.html")
+    with open(listing, "rb") as f:
+        rows = skills.parse_listing(f.read())
+    pages = {"/" + unquote(skills.LISTING_PAGE): listing}
+    for row in rows:
+        path = os.path.join(fixtures, f"skill_{row['2']}.html")
+        if os.path.exists(path):
+            pages["/" + row["1"]] = path
+    return pages
+
+
+@contextlib.contextmanager
+def serve_fixtures(fixtures=FIXTURES, port=0):
+    """在后台线程中提供 fixtures 页面，返回可以传给 skills.py --base-url 的地址"""
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), FixtureHandler)
+    server.pages = fixture_pages(fixtures)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}/"
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+    }
+
+
+def compare(results, baseline, threshold, min_delta=0.002):
+    """和基准比较最快耗时，慢了超过 threshold（比例）并且超过 min_delta 秒的记为退步
+
+    min_delta 避免几毫秒的用例因为计时抖动被误报。
+    """
+    regressions = []
+    for name, cases in results.items():
+        for case, r in cases.items():
+            base = baseline.get(name, {}).get(case)
+            if base is None:
+                continue
+            ratio = r["best"] / base["best"]
+            if ratio > 1 + threshold and r["best"] - base["best"] > min_delta:
+                regressions.append((name, case, base["best"], r["best"], ratio))
+    return regressions
+
+
+def report(name, result):
+    print(f"[{name}]")
+    for case, r in result.items():
+        line = (
+            f"  {case:<20} best {r['best'] * 1000:9.1f} ms  mean {r['mean'] * 1000:9.1f} ms"
+            f"  peak {r['peak_kb'] / 1024:7.1f} MiB"
+        )
+        if "rss_kb" in r:
+            line += f"  rss +{r['rss_kb'] / 1024:6.1f} MiB"
+        if "throughput" in r:
+            line += f"  {r['throughput']:12,.0f} /s"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("names", nargs="*", help="要运行的基准测试，默认全部")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default="", help="把结果写入 JSON 文件")
+    parser.add_argument(
+        "--baseline",
+        nargs="?",
+        const=BASELINE,
+        default=None,
+        help=f"和这个结果文件比较，慢了超过 --threshold 时退出码为 1；不带路径时为 {BASELINE}",
+    )
+    parser.add_argument("--save-baseline", action="store_true", help=f"把结果记录为本机的基准 {BASELINE}")
+    parser.add_argument("--threshold", type=float, default=0.2, help="比基准慢多少比例算退步")
+    parser.add_argument("--write-fixtures", action="store_true", help="重新生成 python/fixtures")
+    parser.add_argument(
+        "--serve", type=int, default=None, metavar="PORT", help="提供 fixtures 页面给 skills.py --base-url"
+    )
+    args = parser.parse_args()
+
+    if args.write_fixtures:
+        write_fixtures()
+        sys.exit(0)
+    if args.serve is not None:
+        with serve_fixtures(port=args.serve) as base_url:
+            print(f"python python/skills.py --base-url {base_url} --cache-dir \"\"，Ctrl+C 退出")
+            try:
+                threading.Event().wait()
+            except KeyboardInterrupt:
+                pass
+        sys.exit(0)
+
+    # 先读入基准，--output 覆盖同一个文件时仍和旧的结果比较
+    baseline = None
+    if args.baseline:
+        if not os.path.exists(args.baseline):
+            sys.exit(f"找不到基准 {args.baseline}，先在本机用 --save-baseline 记录")
+        baseline = _load_json(args.baseline)["results"]
+
+    results = {}
+    for name in args.names or BENCHMARKS:
+        results[name] = BENCHMARKS[name](args.repeat)
+        report(name, results[name])
+
+    for path in filter(None, [args.output, args.save_baseline and BASELINE]):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"environment": environment(), "results": results},
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for name, case, base, now, ratio in regressions:
+            print(f"[退步] {name}/{case}: {base * 1000:.1f} ms -> {now * 1000:.1f} ms（{ratio:.2f}x）")
+        if regressions:
+            sys.exit(1)
+        print(f"没有超过 {args.threshold:.0%} 的退步")
@@ -0,0 +1,280 @@
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+STATE_PATH = ".build_state.json"
+
+
+@dataclass
+class Stage:
+    name: str
+    command: list[str]
+    inputs: list[str]
+    outputs: list[str]
+    # 需要联网的抓取步骤没有可比较的输入，只在 --fetch 时运行
+    network: bool = False
+    deps: list[str] = field(default_factory=list)
+
+
+PY = sys.executable
+
+
+def modules(script: str) -> list[str]:
+    """脚本和它直接或间接导入的 python/ 下的模块（包括函数内的导入），任何一个改变都要重新运行"""
+    seen = set()
+    pending = [script]
+    while pending:
+        path = pending.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        with open(path, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                module = f"python/{name.split('.')[0]}.py"
+                if os.path.exists(module):
+                    pending.append(module)
+    return sorted(seen)
+
+STAGES = [
+    Stage(
+        "fetch-names",
+        [PY, "python/umas.py"],
+        inputs=[],
+        outputs=["python/name.lua"],
+        network=True,
+    ),
+    # 读取 name.lua 的阶段都依赖预建索引，由这一阶段先单独建好，
+    # 之后并行运行的阶段只读取索引，不会同时重建、写入同一个文件
+    Stage(
+        "name-index",
+        [PY, "python/umas.py", "--skip-download", "--index-only"],
+        inputs=[*modules("python/umas.py"), "python/name.lua"],
+        outputs=["python/name.lua.idx", "name.json"],
+    ),
+    Stage(
+        "fetch-skills",
+        [PY, "python/skills.py", "--incremental"],
+        inputs=[*modules("python/skills.py"), "python/name.lua", "python/name.lua.idx"],
+        outputs=["rets.json"],
+        network=True,
+    ),
+    Stage(
+        "names",
+        [PY, "python/umas.py", "--skip-download"],
+        inputs=[*modules("python/umas.py"), "python/name.lua", "python/name.lua.idx"],
+        outputs=[
+            f"umalator-cn/{stem}{suffix}.json"
+            for stem in ("umas", "skillnames", "racetracks", "charanames", "racenames")
+            for suffix in ("", ".TW", ".JP")
+        ],
+    ),
+    Stage(
+        "merge",
+        [PY, "python/merge.py"],
+        inputs=[
+            *modules("python/merge.py"),
+            "python/name.lua",
+            "python/name.lua.idx",
+            "rets.json",
+            "custom_patch.json",
+            "uma-skill-tools/data/skill_data.json",
+        ],
+        outputs=["umalator-cn/skill_data.json", "merge_changes.json"],
+    ),
+    Stage(
+        "slopes",
+        [PY, "python/slope.py"],
+        inputs=[
+            *modules("python/slope.py"),
+            "course_data_normal.json",
+            "course_data_slope.json",
+        ],
+        outputs=["umalator-cn/course_data.json", "course_data.pack"],
+    ),
+    Stage(
+        "activation",
+        [PY, "python/activation.py"],
+        inputs=[
+            *modules("python/activation.py"),
+            "umalator-cn/skill_data.json",
+            "umalator-cn/course_data.json",
+            "course_data.pack",
+        ],
+        outputs=["umalator-cn/activation.json"],
+    ),
+]
+
+
+class FileHashes:
+    """文件哈希，大小和修改时间没变时沿用上次记录的哈希，不重新读文件"""
+
+    def __init__(self, known: dict):
+        self.known = known
+
+    def __call__(self, path: str) -> str | None:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        stamp = [st.st_size, st.st_mtime_ns]
+        cached = self.known.get(path)
+        if cached is not None and cached[:2] == stamp:
+            return cached[2]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        self.known[path] = stamp + [h.hexdigest()]
+        return self.known[path][2]
+
+
+def resolve(stages: list[Stage]) -> dict[str, Stage]:
+    """根据输出文件推出阶段之间的依赖"""
+    producer = {}
+    for stage in stages:
+        for out in stage.outputs:
+            producer[out] = stage.name
+    for stage in stages:
+        stage.deps = sorted(
+            {producer[i] for i in stage.inputs if i in producer and producer[i] != stage.name}
+        )
+    return {stage.name: stage for stage in stages}
+
+
+def select(graph: dict[str, Stage], targets: list[str], fetch: bool) -> list[str]:
+    """目标阶段及其全部上游；不带 --fetch 时去掉联网阶段"""
+    chosen = set()
+    pending = list(targets or graph)
+    while pending:
+        name = pending.pop()
+        if name not in graph:
+            raise SystemExit(f"未知阶段：{name}，可选 {', '.join(graph)}")
+        if name in chosen or (graph[name].network and not fetch):
+            continue
+        chosen.add(name)
+        pending.extend(graph[name].deps)
+    return [name for name in graph if name in chosen]
+
+
+class Builder:
+    def __init__(self, stages=STAGES, state_path=STATE_PATH, jobs=4, force=False):
+        self.graph = resolve(stages)
+        self.state_path = state_path
+        self.jobs = jobs
+        self.force = force
+        self.state = {"files": {}, "stages": {}}
+        if os.path.exists(state_path):
+            with open(state_path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+        self.hash = FileHashes(self.state["files"])
+
+    def _fingerprint(self, stage: Stage, paths: list[str]) -> dict:
+        return {path: self.hash(path) for path in paths}
+
+    def up_to_date(self, stage: Stage) -> bool:
+        if self.force or stage.network:
+            return False
+        record = self.state["stages"].get(stage.name)
+        if record is None:
+            return False
+        return (
+            record["command"] == stage.command[1:]
+            and record["inputs"] == self._fingerprint(stage, stage.inputs)
+            and record["outputs"] == self._fingerprint(stage, stage.outputs)
+        )
+
+    def _run(self, stage: Stage) -> tuple[bool, float, str]:
+        missing = [path for path in stage.inputs if not os.path.exists(path)]
+        if missing:
+            return False, 0.0, f"缺少输入：{', '.join(missing)}"
+        start = time.perf_counter()
+        proc = subprocess.run(stage.command, capture_output=True, text=True, encoding="utf-8")
+        elapsed = time.perf_counter() - start
+        return proc.returncode == 0, elapsed, (proc.stdout + proc.stderr).strip()
+
+    def build(self, targets=None, fetch=False, dry_run=False) -> bool:
+        """按依赖顺序运行，互不依赖的阶段并行；返回是否全部成功"""
+        order = select(self.graph, targets, fetch)
+        done, failed = set(), set()
+        running = {}
+        ok = True
+
+        def ready(name):
+            deps = [d for d in self.graph[name].deps if d in order]
+            return all(d in done for d in deps)
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            remaining = list(order)
+            while remaining or running:
+                for name in list(remaining):
+                    stage = self.graph[name]
+                    if any(d in failed for d in stage.deps):
+                        print(f"[跳过] {name}：上游阶段失败")
+                        failed.add(name)
+                        remaining.remove(name)
+                    elif ready(name):
+                        remaining.remove(name)
+                        if self.up_to_date(stage):
+                            print(f"[最新] {name}")
+                            done.add(name)
+                        elif dry_run:
+                            print(f"[需要运行] {name}")
+                            done.add(name)
+                        else:
+                            print(f"[运行] {name}: {' '.join(stage.command[1:])}")
+                            running[pool.submit(self._run, stage)] = name
+                if not running:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    stage = self.graph[name]
+                    success, elapsed, output = future.result()
+                    if success:
+                        print(f"[完成] {name}（{elapsed:.2f}s）")
+                        self.state["stages"][name] = {
+                            "command": stage.command[1:],
+                            "inputs": self._fingerprint(stage, stage.inputs),
+                            "outputs": self._fingerprint(stage, stage.outputs),
+                        }
+                        done.add(name)
+                    else:
+                        print(f"[失败] {name}\n{output}")
+                        failed.add(name)
+                        ok = False
+
+        if not dry_run:
+            with open(self.state_path, "w", encoding="utf-8") as f:
+                json.dump(self.state, f, ensure_ascii=False, indent=2)
+        return ok and not failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="按依赖关系构建 umalator-cn 的数据")
+    parser.add_argument("targets", nargs="*", help="要构建的阶段，默认全部（会自动带上上游阶段）")
+    parser.add_argument("--fetch", action="store_true", help="同时运行联网抓取阶段")
+    parser.add_argument("--force", action="store_true", help="忽略记录，全部重新运行")
+    parser.add_argument("--dry-run", action="store_true", help="只显示需要运行的阶段")
+    parser.add_argument("-j", "--jobs", type=int, default=4, help="并行运行的阶段数")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    builder = Builder(jobs=args.jobs, force=args.force)
+    ok = builder.build(args.targets, fetch=args.fetch, dry_run=args.dry_run)
+    print(f"总耗时 {time.perf_counter() - start:.2f}s")
+    sys.exit(0 if ok else 1)
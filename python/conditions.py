@@ -0,0 +1,304 @@
+"""技能发动条件的解析、比较和去重
+
+条件语法（与 uma-skill-tools 的 ConditionParser 一致）：
+    条件   := 分支 ("@" 分支)*       "@" 为“或”，优先级最低
+    分支   := 项 ("&" 项)*           "&" 为“且”
+    项     := 变量名 运算符 整数       运算符为 == != >= <= > <
+
+compile_condition 得到的 AST 中，每个分支的项按 (变量名, 运算符, 值) 排序并去重，
+分支之间也排序去重，所以只有项的顺序或空格不同的条件会得到相同的 AST。判断两个条件
+是否相同用 equivalent：含随机类的项时 simulator 的采样和项的顺序有关，这时顺序也要相同。
+"""
+
+import argparse
+import re
+from typing import NamedTuple
+
+WORKER = "umalator-cn/simulator.worker.js"
+
+# simulator.worker.js 中 Conditions 实现的变量（scan_worker 的 defined）
+SIMULATOR_VARIABLES = frozenset(
+    """
+    accumulatetime activate_count_all activate_count_end_after activate_count_heal
+    activate_count_middle activate_count_start all_corner_random always base_power
+    base_speed base_stamina base_guts base_wiz bashin_diff_behind bashin_diff_infront
+    behind_near_lane_time behind_near_lane_time_set1 blocked_all_continuetime blocked_front
+    blocked_front_continuetime blocked_side_continuetime change_order_onetime
+    change_order_up_end_after change_order_up_finalcorner_after change_order_up_middle
+    compete_fight_count corner corner_count corner_random course_distance distance_diff_rate
+    distance_diff_top distance_diff_top_float distance_rate distance_rate_after_random
+    distance_type down_slope_random grade ground_condition ground_type hp_per
+    infront_near_lane_time is_activate_other_skill_detail is_basis_distance is_badstart
+    is_behind_in is_dirtgrade is_finalcorner is_finalcorner_laterhalf is_finalcorner_random
+    is_hp_empty_onetime is_lastspurt is_last_straight is_last_straight_onetime is_move_lane
+    is_overtake is_surrounded is_temptation is_used_skill_id lane_type lastspurt motivation
+    near_count order order_rate order_rate_in20_continue order_rate_in40_continue
+    order_rate_in80_continue order_rate_out20_continue order_rate_out40_continue
+    order_rate_out50_continue order_rate_out70_continue overtake_target_no_order_up_time
+    overtake_target_time phase phase_corner_random phase_firsthalf_random phase_firstquarter
+    phase_firstquarter_random phase_laterhalf_random phase_random phase_straight_random
+    popularity post_number random_lot remain_distance rotation running_style
+    running_style_count_same running_style_count_same_rate running_style_count_nige_otherself
+    running_style_count_senko_otherself running_style_count_sashi_otherself
+    running_style_count_oikomi_otherself running_style_equal_popularity_one
+    running_style_temptation_count_nige running_style_temptation_count_senko
+    running_style_temptation_count_sashi running_style_temptation_count_oikomi
+    same_skill_horse_count season slope straight_front_type straight_random temptation_count
+    temptation_count_behind temptation_count_infront time track_id up_slope_random
+    visiblehorse weather
+    """.split()
+)
+
+# worker 打包的技能数据里用到、但 Conditions 没有实现的变量（scan_worker 的 used 中多出的部分）。
+# 这些是游戏数据里真实存在的变量，不算错误
+DATA_VARIABLES = frozenset(
+    """
+    activate_count_later_half furlong is_activate_any_skill is_activate_heal_skill
+    is_exist_skill_id is_other_character_activate_advantage_skill near_infront_count
+    phase_first_half_straight_random phase_firsthalf phase_laterhalf
+    phase_latter_half_straight_random temptation_opponent_count_behind
+    up_slope_random_later_half
+    """.split()
+)
+
+VARIABLES = SIMULATOR_VARIABLES | DATA_VARIABLES
+
+# 数据里出现过的笔误，不列入 VARIABLES，让 merge.py 继续报告
+TYPOS = {"s_finalcorner": "is_finalcorner"}
+
+OPERATORS = ("==", "!=", ">=", "<=", ">", "<")
+
+TOKEN = re.compile(r"\s*(?:(?P<name>[A-Za-z_]\w*)|(?P<num>-?\d+)|(?P<op>==|!=|>=|<=|[<>&@]))")
+
+
+class ConditionError(ValueError):
+    """条件字符串格式错误，column 为出错位置（从 1 开始）"""
+
+    def __init__(self, message: str, text: str, column: int):
+        super().__init__(f"{message}（第 {column} 列）：{text}")
+        self.text = text
+        self.column = column
+
+
+class Term(NamedTuple):
+    name: str
+    op: str
+    value: int
+
+    def __str__(self):
+        return f"{self.name}{self.op}{self.value}"
+
+
+# 分支为 tuple[Term, ...]，条件为 tuple[分支, ...]
+Condition = tuple[tuple[Term, ...], ...]
+
+
+def _tokens(text: str):
+    pos = 0
+    end = len(text.rstrip())
+    while pos < end:
+        m = TOKEN.match(text, pos)
+        if m is None:
+            raise ConditionError("无法识别的字符", text, pos + 1)
+        yield m.lastgroup, m.group(m.lastgroup), m.start(m.lastgroup) + 1
+        pos = m.end()
+
+
+def parse(text: str, strict=True) -> Condition:
+    """解析为 AST，保留原来的项顺序；strict 时检查变量名。空字符串为没有条件"""
+    if not text.strip():
+        return ()
+    branches = [[]]
+    expect = "name"
+    term = []
+    column = 1
+    for kind, value, column in _tokens(text):
+        if expect == "name":
+            if kind != "name":
+                raise ConditionError("应为变量名", text, column)
+            if strict and value not in VARIABLES:
+                raise ConditionError(f"未知变量 {value}", text, column)
+            term = [value]
+            expect = "op"
+        elif expect == "op":
+            if value not in OPERATORS:
+                raise ConditionError("应为比较运算符", text, column)
+            term.append(value)
+            expect = "num"
+        elif expect == "num":
+            if kind != "num":
+                raise ConditionError("应为整数", text, column)
+            branches[-1].append(Term(term[0], term[1], int(value)))
+            expect = "sep"
+        else:
+            if value == "&":
+                pass
+            elif value == "@":
+                branches.append([])
+            else:
+                raise ConditionError("应为 & 或 @", text, column)
+            expect = "name"
+    if expect != "sep":
+        raise ConditionError("条件不完整", text, len(text) + 1)
+    return tuple(tuple(b) for b in branches)
+
+
+def canonical(condition: Condition) -> Condition:
+    """项和分支排序去重后的 AST"""
+    return tuple(sorted({tuple(sorted(set(branch))) for branch in condition}))
+
+
+def compile_condition(text: str, strict=True) -> Condition:
+    return canonical(parse(text, strict))
+
+
+def to_string(condition: Condition) -> str:
+    return "@".join("&".join(str(term) for term in branch) for branch in condition)
+
+
+def variables(condition: Condition) -> set[str]:
+    return {term.name for branch in condition for term in branch}
+
+
+def is_random(condition: Condition) -> bool:
+    """条件中有随机类的项（*_random）时，simulator 的采样结果和项的顺序有关"""
+    return any("random" in term.name for branch in condition for term in branch)
+
+
+def equivalent(a: str, b: str) -> bool:
+    """两个条件是否相同
+
+    空格不同的视为相同；没有随机类的项时，项和分支的顺序不同也视为相同。有随机类的项时
+    顺序会影响采样出的区间，要求顺序也相同。无法解析时退回到去掉空格后的文本比较。
+    """
+    if a == b:
+        return True
+    if not isinstance(a, str) or not isinstance(b, str):
+        return False
+    try:
+        pa, pb = parse(a, strict=False), parse(b, strict=False)
+    except ConditionError:
+        return a.replace(" ", "") == b.replace(" ", "")
+    if is_random(pa) or is_random(pb):
+        return pa == pb
+    return canonical(pa) == canonical(pb)
+
+
+def validate(text: str) -> list[str]:
+    """返回条件中不认识的变量名（不在 VARIABLES 中）；格式错误时抛出 ConditionError"""
+    if not text:
+        return []
+    return sorted(variables(parse(text, strict=False)) - VARIABLES)
+
+
+class ConditionTable:
+    """条件去重表：相同的条件文本只保存一次，技能里用编号引用
+
+    按原文去重而不是按排序后的 AST，因为 simulator 按书写顺序依次筛选区间，
+    随机类条件的采样结果和项的顺序有关，所以不改写条件文本。
+    """
+
+    FIELDS = ("condition", "precondition")
+
+    def __init__(self, conditions=()):
+        self.conditions = list(conditions)
+        self._ids = {text: i for i, text in enumerate(self.conditions)}
+
+    def intern(self, text: str) -> int:
+        if text not in self._ids:
+            parse(text, strict=False)
+            self._ids[text] = len(self.conditions)
+            self.conditions.append(text)
+        return self._ids[text]
+
+    def intern_skills(self, skills: dict) -> dict:
+        """返回把 condition / precondition 换成编号的技能数据，不修改传入的对象"""
+        result = {}
+        for key, skill in skills.items():
+            alternatives = []
+            for alt in skill["alternatives"]:
+                alt = dict(alt)
+                for field in self.FIELDS:
+                    if isinstance(alt.get(field), str):
+                        alt[field] = self.intern(alt[field])
+                alternatives.append(alt)
+            result[key] = {**skill, "alternatives": alternatives}
+        return result
+
+    def expand_skills(self, skills: dict) -> dict:
+        """intern_skills 的逆操作"""
+        result = {}
+        for key, skill in skills.items():
+            alternatives = []
+            for alt in skill["alternatives"]:
+                alt = dict(alt)
+                for field in self.FIELDS:
+                    if isinstance(alt.get(field), int):
+                        alt[field] = self.conditions[alt[field]]
+                alternatives.append(alt)
+            result[key] = {**skill, "alternatives": alternatives}
+        return result
+
+    def to_json(self, skills: dict) -> dict:
+        return {"conditions": self.conditions, "skills": self.intern_skills(skills)}
+
+    @classmethod
+    def from_json(cls, data: dict) -> dict:
+        return cls(data["conditions"]).expand_skills(data["skills"])
+
+
+_CONDITION_LITERAL = re.compile(r'(?:pre)?condition:"([^"]*)"')
+_CONDITIONS_OBJECT = "Object.freeze({accumulatetime:"
+_JS_TOKEN = re.compile(r'[A-Za-z_$][\w$]*|"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|`(?:\\.|[^`\\])*`|\S')
+
+
+def scan_worker(source: str) -> tuple[set[str], set[str]]:
+    """从打包后的 simulator.worker.js 中取出 (Conditions 实现的变量, 技能数据中用到的变量)
+
+    用于更新 SIMULATOR_VARIABLES 和 DATA_VARIABLES。
+    """
+    defined = set()
+    start = source.find(_CONDITIONS_OBJECT)
+    if start != -1:
+        depth = 0
+        expect_key = False
+        for m in _JS_TOKEN.finditer(source, start + len("Object.freeze(")):
+            token = m.group()
+            if token in "{([":
+                depth += 1
+                expect_key = depth == 1
+            elif token in "})]":
+                depth -= 1
+                if depth == 0:
+                    break
+            elif depth == 1:
+                if token == ",":
+                    expect_key = True
+                elif expect_key and token != ":":
+                    defined.add(token.strip("\"'"))
+                    expect_key = False
+    used = set()
+    for text in _CONDITION_LITERAL.findall(source):
+        try:
+            used |= variables(parse(text, strict=False))
+        except ConditionError:
+            pass
+    return defined, used
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="检查 VARIABLES 和 simulator.worker.js 是否一致")
+    parser.add_argument("worker", nargs="?", default=WORKER)
+    args = parser.parse_args()
+
+    with open(args.worker, "r", encoding="utf-8") as f:
+        defined, used = scan_worker(f.read())
+    print(f"Conditions 实现 {len(defined)} 个变量，技能数据用到 {len(used)} 个")
+    for label, names in (
+        ("SIMULATOR_VARIABLES 缺少", defined - SIMULATOR_VARIABLES),
+        ("SIMULATOR_VARIABLES 多出", SIMULATOR_VARIABLES - defined),
+        ("DATA_VARIABLES 缺少", used - defined - DATA_VARIABLES - TYPOS.keys()),
+        ("已知笔误", used & TYPOS.keys()),
+    ):
+        if names:
+            print(f"{label}：{' '.join(sorted(names))}")
@@ -0,0 +1,266 @@
+"""赛道几何的二进制打包格式
+
+把 course_data.json 里每条赛道的 corners / straights / slopes 展开成逐米数组，
+附带前缀和，读取时用 mmap 直接映射，按位置和区间查询都是 O(1)，不需要解析 JSON。
+
+文件布局（小端序，各数组按 8 字节对齐）：
+    头部      magic "UMCP", version u16, 保留 u16, 赛道数 u32, 总点数 u32
+    赛道表    每条 16 字节：id u32, distance u32, offset u32, 弯道数 u8, surface u8,
+              distanceType u8, turn u8
+    逐米数组  flags u8, corner u8, slope f32         （共 总点数 个）
+    前缀和    corner/straight/up/down 米数 u32, slope 累加 f64（共 总点数 + 1 个）
+
+每条赛道占 distance + 1 个点（第 0 米到终点），第 k 米在数组中的下标为 offset + k。
+"""
+
+import argparse
+import json
+import math
+import mmap
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b"UMCP"
+VERSION = 1
+HEADER = struct.Struct("<4sHHII")
+COURSE = struct.Struct("<IIIBBBB")
+
+# flags 的各个位
+CORNER = 1
+STRAIGHT = 2
+UPHILL = 4
+DOWNHILL = 8
+PHASE_SHIFT = 4  # 第 4、5 位为阶段 0-3
+
+# 阶段起点占全程的比例：序盘、中盘、终盘、最终直线（last spurt 区间）
+PHASE_STARTS = (0, 1 / 6, 2 / 3, 5 / 6)
+
+_ARRAYS = (
+    ("flags", "B", np.uint8, 0),
+    ("corner", "B", np.uint8, 0),
+    ("slope", "f", np.float32, 0),
+    ("cum_corner", "I", np.uint32, 1),
+    ("cum_straight", "I", np.uint32, 1),
+    ("cum_up", "I", np.uint32, 1),
+    ("cum_down", "I", np.uint32, 1),
+    ("cum_slope", "d", np.float64, 1),
+)
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def _span(start, end, n) -> slice:
+    """[start, end) 覆盖的整数米，端点可以是小数"""
+    return slice(math.ceil(start), min(n, math.ceil(end)))
+
+
+def _course_arrays(course):
+    distance = int(course["distance"])
+    n = distance + 1
+    meters = np.arange(n)
+    flags = np.zeros(n, dtype=np.uint8)
+    corner = np.zeros(n, dtype=np.uint8)
+    slope = np.zeros(n, dtype=np.float32)
+
+    for i, c in enumerate(course.get("corners", []), start=1):
+        span = _span(c["start"], c["start"] + c["length"], n)
+        flags[span] |= CORNER
+        corner[span] = i
+    for s in course.get("straights", []):
+        flags[_span(s["start"], s["end"], n)] |= STRAIGHT
+    for s in course.get("slopes", []):
+        span = _span(s["start"], s["start"] + s["length"], n)
+        slope[span] = s["slope"]
+        flags[span] |= UPHILL if s["slope"] > 0 else DOWNHILL if s["slope"] < 0 else 0
+
+    bounds = np.array([distance * p for p in PHASE_STARTS])
+    phase = np.searchsorted(bounds, meters, side="right") - 1
+    flags |= (phase << PHASE_SHIFT).astype(np.uint8)
+    return flags, corner, slope
+
+
+def build_pack(course_data: dict) -> bytes:
+    """把 course_data.json 的内容打包成字节串"""
+    table = []
+    parts = {name: [] for name, *_ in _ARRAYS}
+    offset = 0
+    for course_id, course in course_data.items():
+        flags, corner, slope = _course_arrays(course)
+        table.append(
+            COURSE.pack(
+                int(course_id),
+                int(course["distance"]),
+                offset,
+                len(course.get("corners", [])),
+                course.get("surface", 0),
+                course.get("distanceType", 0),
+                course.get("turn", 0),
+            )
+        )
+        parts["flags"].append(flags)
+        parts["corner"].append(corner)
+        parts["slope"].append(slope)
+        offset += len(flags)
+
+    flags = np.concatenate(parts["flags"]) if parts["flags"] else np.zeros(0, np.uint8)
+    columns = {
+        "flags": flags,
+        "corner": np.concatenate(parts["corner"]) if parts["corner"] else np.zeros(0, np.uint8),
+        "slope": np.concatenate(parts["slope"]) if parts["slope"] else np.zeros(0, np.float32),
+    }
+    for name, bit in (
+        ("cum_corner", CORNER),
+        ("cum_straight", STRAIGHT),
+        ("cum_up", UPHILL),
+        ("cum_down", DOWNHILL),
+    ):
+        columns[name] = np.r_[0, np.cumsum((flags & bit) != 0)]
+    columns["cum_slope"] = np.r_[0.0, np.cumsum(columns["slope"], dtype=np.float64)]
+
+    out = bytearray(HEADER.pack(MAGIC, VERSION, 0, len(table), offset))
+    out += b"".join(table)
+    for name, _, dtype, _ in _ARRAYS:
+        out += b"\0" * (_align(len(out)) - len(out))
+        out += columns[name].astype(dtype).tobytes()
+    return bytes(out)
+
+
+def write_pack(course_data: dict, path: str):
+    with open(path, "wb") as f:
+        f.write(build_pack(course_data))
+
+
+def _table_entry(course: dict) -> dict:
+    return {
+        "distance": int(course["distance"]),
+        "corners": len(course.get("corners", [])),
+        "surface": course.get("surface", 0),
+        "distanceType": course.get("distanceType", 0),
+        "turn": course.get("turn", 0),
+    }
+
+
+def is_current(path: str, course_data: dict, source: str | None = None) -> bool:
+    """path 处的数据包能否代替 course_data 使用
+
+    要求数据包不比 source（生成 course_data 的文件）旧，并且赛道表中的赛道 id、距离、弯道数等
+    和 course_data 逐条一致；文件不存在或格式版本不同时返回 False。
+    """
+    try:
+        if source is not None and os.path.getmtime(path) < os.path.getmtime(source):
+            return False
+        with CoursePack(path) as pack:
+            table = {
+                course_id: {k: v for k, v in course.items() if k != "offset"}
+                for course_id, course in pack.courses.items()
+            }
+    except (OSError, ValueError, struct.error):
+        return False
+    return table == {course_id: _table_entry(course) for course_id, course in course_data.items()}
+
+
+class CoursePack:
+    """只读访问打包后的赛道几何，所有查询都是 O(1)"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buf = buf = memoryview(self._mmap)
+        magic, version, _, n_courses, n_meters = HEADER.unpack_from(buf)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} 不是版本 {VERSION} 的赛道数据包")
+
+        self.courses = {}
+        pos = HEADER.size
+        for _ in range(n_courses):
+            course_id, distance, offset, corners, surface, distance_type, turn = (
+                COURSE.unpack_from(buf, pos)
+            )
+            self.courses[str(course_id)] = {
+                "distance": distance,
+                "offset": offset,
+                "corners": corners,
+                "surface": surface,
+                "distanceType": distance_type,
+                "turn": turn,
+            }
+            pos += COURSE.size
+
+        for name, fmt, dtype, extra in _ARRAYS:
+            pos = _align(pos)
+            size = (n_meters + extra) * np.dtype(dtype).itemsize
+            setattr(self, name, buf[pos : pos + size].cast(fmt))
+            pos += size
+
+    def _index(self, course_id, meter) -> int:
+        course = self.courses[str(course_id)]
+        meter = min(max(int(meter), 0), course["distance"])
+        return course["offset"] + meter
+
+    def at(self, course_id, meter) -> dict:
+        """第 meter 米处的弯道编号（从 1 开始，0 为不在弯道）、是否直线、坡度和阶段"""
+        i = self._index(course_id, meter)
+        flags = self.flags[i]
+        return {
+            "corner": self.corner[i],
+            "final_corner": self.corner[i] != 0
+            and self.corner[i] == self.courses[str(course_id)]["corners"],
+            "straight": bool(flags & STRAIGHT),
+            "slope": self.slope[i],
+            "phase": flags >> PHASE_SHIFT,
+        }
+
+    def range(self, course_id, start, end) -> dict:
+        """区间 [start, end) 内弯道、直线、上坡、下坡的米数和平均坡度"""
+        a = self._index(course_id, start)
+        b = max(a, self._index(course_id, end))
+        n = b - a
+        return {
+            "corner": self.cum_corner[b] - self.cum_corner[a],
+            "straight": self.cum_straight[b] - self.cum_straight[a],
+            "up": self.cum_up[b] - self.cum_up[a],
+            "down": self.cum_down[b] - self.cum_down[a],
+            "mean_slope": (self.cum_slope[b] - self.cum_slope[a]) / n if n else 0.0,
+        }
+
+    def phase_bounds(self, course_id) -> list[float]:
+        """各阶段的起点（米）"""
+        distance = self.courses[str(course_id)]["distance"]
+        return [distance * p for p in PHASE_STARTS]
+
+    def column(self, name, course_id):
+        """某条赛道的整列逐米数据（memoryview，可直接交给 numpy.frombuffer）"""
+        course = self.courses[str(course_id)]
+        start = course["offset"]
+        end = start + course["distance"] + 1
+        if name.startswith("cum_"):
+            end += 1
+        return getattr(self, name)[start:end]
+
+    def close(self):
+        for name, *_ in _ARRAYS:
+            getattr(self, name).release()
+        self._buf.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", nargs="?", default="umalator-cn/course_data.json")
+    parser.add_argument("--output", default="course_data.pack")
+    args = parser.parse_args()
+
+    with open(args.input, "r", encoding="utf-8") as f:
+        course_data = json.load(f)
+    write_pack(course_data, args.output)
+    print(f"打包完成，生成 {args.output}")
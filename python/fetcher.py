@@ -0,0 +1,162 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from http_cache import HttpCache, OfflineCacheMiss
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36 Edg/138.0.0.0",
+    "Accept-Language": "zh-CN,zh;q=0.9",
+}
+
+# 这些状态码视为临时错误，会重试
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """所有线程共享的请求速率上限（每秒 rate 次），rate 为 None 时不限速"""
+
+    def __init__(self, rate: float | None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class Fetcher:
+    """共用一个连接池的并发下载器，带并发上限、限速和指数退避重试"""
+
+    def __init__(
+        self,
+        headers: dict | None = None,
+        concurrency: int = 8,
+        rate: float | None = 5.0,
+        retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 30.0,
+        cache: HttpCache | None = None,
+    ):
+        self.concurrency = max(1, concurrency)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cache = cache
+        self.limiter = RateLimiter(rate)
+
+        self.session = requests.Session()
+        self.session.headers.update(headers or DEFAULT_HEADERS)
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.concurrency, max_retries=0
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.pages = 0
+        self.bytes = 0
+        self.last_batch = (0, 0.0)  # 最近一次 get_many 的 (页数, 耗时)
+        self._stats_lock = threading.Lock()
+
+    def get(self, url: str) -> bytes:
+        """下载单个页面，失败时按 backoff * 2^n 退避重试，最后仍失败则抛出异常
+
+        配置了 cache 时：TTL 内或离线模式直接读缓存，否则带 ETag/Last-Modified 重新验证。
+        每个请求的耗时、状态码、字节数和重试次数记录到 metrics
+        """
+        start = time.perf_counter()
+        outcome = {"status": None, "bytes": 0, "retries": 0, "source": "network"}
+        try:
+            content = self._get(url, outcome)
+            outcome["bytes"] = len(content)
+            return content
+        except Exception as e:
+            outcome["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            metrics.request(url, time.perf_counter() - start, **outcome)
+
+    def _get(self, url: str, outcome: dict) -> bytes:
+        entry = self.cache.lookup(url) if self.cache else None
+        if entry is not None and self.cache.is_fresh(entry):
+            outcome["source"] = "cache"
+            return self.cache.load(url, entry)
+        if self.cache and self.cache.offline:
+            raise OfflineCacheMiss(f"离线模式下没有缓存：{url}")
+        headers = self.cache.conditional_headers(entry) if entry else None
+
+        attempt = 0
+        while True:
+            self.limiter.wait()
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+                outcome["status"] = response.status_code
+                if response.status_code == 304 and entry is not None:
+                    outcome["source"] = "revalidated"
+                    return self.cache.load(url, entry, revalidated=True)
+                if response.status_code not in RETRY_STATUS:
+                    response.raise_for_status()
+                    break
+                error = requests.HTTPError(
+                    f"{response.status_code} for {url}", response=response
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+                response = None
+            if attempt >= self.retries:
+                raise error
+            delay = self.backoff * 2**attempt
+            if response is not None and response.headers.get("Retry-After", "").isdigit():
+                delay = max(delay, float(response.headers["Retry-After"]))
+            attempt += 1
+            outcome["retries"] = attempt
+            time.sleep(delay)
+
+        with self._stats_lock:
+            self.pages += 1
+            self.bytes += len(response.content)
+        if self.cache:
+            self.cache.store(url, response)
+        return response.content
+
+    def get_many(self, urls: list[str]) -> list[bytes | Exception]:
+        """并发下载，结果顺序与 urls 一致；失败的位置放入对应的异常"""
+
+        def task(url):
+            try:
+                return self.get(url)
+            except requests.RequestException as e:
+                return e
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            results = list(pool.map(task, urls))
+        self.last_batch = (len(urls), time.perf_counter() - start)
+        return results
+
+    def throughput(self) -> float:
+        """最近一次 get_many 的平均速度（页/秒）"""
+        pages, elapsed = self.last_batch
+        return pages / elapsed if elapsed else 0.0
+
+    def close(self):
+        self.session.close()
+        if self.cache:
+            self.cache.save()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,121 @@
+"""从 wiki 页面中取出单个元素的文本，以及严格的 JSON 解码
+
+速查表只需要 div#jn-json 的文本，翻译数据库页面只需要 pre.mw-code 的文本，不需要建立整棵
+BeautifulSoup 树。find_text 用 lxml 的 HTMLPullParser 分块喂入页面，找到目标元素的结束标签
+后立即返回；目标之前已经解析完的元素随时释放，内存占用不随页面大小增长。
+
+loads_strict 在 JSON 格式错误时给出行号、列号和附近的文本，多余的逗号单独说明。
+"""
+
+import json
+import re
+
+from lxml import etree
+
+CHUNK_SIZE = 64 * 1024
+
+_FINAL_COMMA = re.compile(r",(\s*)\]\s*$")
+
+
+class ExtractError(ValueError):
+    """页面中找不到目标元素，或者其中的 JSON 无法解析"""
+
+
+def _matches(elem, tag: str, attrs: dict) -> bool:
+    if elem.tag != tag:
+        return False
+    for name, value in attrs.items():
+        actual = elem.get(name)
+        if actual is None:
+            return False
+        if name == "class":
+            # 和 CSS 选择器一样，只要包含这些 class 即可
+            if not set(value.split()) <= set(actual.split()):
+                return False
+        elif actual != value:
+            return False
+    return True
+
+
+def _release(elem):
+    """释放已经处理完的元素和它前面的兄弟节点"""
+    elem.clear(keep_tail=True)
+    parent = elem.getparent()
+    if parent is not None:
+        while elem.getprevious() is not None:
+            del parent[0]
+
+
+def _describe(tag: str, attrs: dict) -> str:
+    return tag + "".join(f'[{k}="{v}"]' for k, v in attrs.items())
+
+
+def find_text(content: bytes, tag: str, attrs: dict | None = None, encoding="utf-8",
+              chunk_size=CHUNK_SIZE) -> str:
+    """返回第一个匹配的元素的全部文本（和 BeautifulSoup 的 get_text() 相同）
+
+    attrs 中的 class 按包含关系匹配，其它属性要求完全相同。找不到时抛出 ExtractError。
+    """
+    attrs = attrs or {}
+    parser = etree.HTMLPullParser(events=("start", "end"), encoding=encoding)
+    target = None
+
+    def events():
+        nonlocal target
+        for event, elem in parser.read_events():
+            if event == "start":
+                if target is None and _matches(elem, tag, attrs):
+                    target = elem
+            elif elem is target:
+                return "".join(elem.itertext())
+            elif target is None:
+                _release(elem)
+        return None
+
+    for offset in range(0, len(content), chunk_size):
+        parser.feed(content[offset : offset + chunk_size])
+        text = events()
+        if text is not None:
+            return text
+    parser.close()
+    text = events()
+    if text is not None:
+        return text
+    raise ExtractError(f"页面中找不到 {_describe(tag, attrs)}")
+
+
+def _location(text: str, pos: int) -> str:
+    line = text.count("\n", 0, pos) + 1
+    column = pos - (text.rfind("\n", 0, pos) + 1) + 1
+    snippet = text[max(0, pos - 30) : pos + 30].replace("\n", "\\n")
+    return f"第 {line} 行第 {column} 列（…{snippet}…）"
+
+
+def loads_strict(text: str, source: str = "JSON"):
+    """json.loads，出错时抛出带位置说明的 ExtractError"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        before = text[: e.pos].rstrip()
+        if text[e.pos : e.pos + 1] in ("]", "}") and before.endswith(","):
+            comma = len(before) - 1
+            raise ExtractError(
+                f"{source} 在{_location(text, comma)}有多余的逗号（最后一项后面不能有逗号）"
+            ) from e
+        raise ExtractError(f"{source} 在{_location(text, e.pos)}无法解析：{e.msg}") from e
+
+
+def load_array(text: str, source: str = "JSON", final_comma=True):
+    """取出文本中最外层的 [...] 并解析
+
+    final_comma 时允许最后一项后面有一个逗号（wiki 的速查表模板总会多输出一个），
+    只去掉紧挨着结尾 ] 的那一个逗号，其它位置的格式错误照常报错。
+    """
+    start = text.find("[")
+    end = text.rfind("]") + 1
+    if start == -1 or end <= start:
+        raise ExtractError(f"{source} 中找不到 JSON 数组")
+    body = text[start:end]
+    if final_comma:
+        body = _FINAL_COMMA.sub(r"\1]", body, count=1)
+    return loads_strict(body, source)
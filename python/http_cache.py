@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+
+
+class OfflineCacheMiss(requests.RequestException):
+    """离线模式下缓存中没有该 URL"""
+
+
+class HttpCache:
+    """按 URL 索引、按内容哈希存储的磁盘响应缓存
+
+    目录结构：
+        index.json        URL -> {hash, etag, last_modified, fetched, accessed, size}
+        objects/ab/abcd…  以 sha256 命名的响应内容，相同内容只存一份
+    """
+
+    def __init__(
+        self,
+        root: str = ".http_cache",
+        ttl: float | None = None,
+        max_bytes: int = 512 * 1024 * 1024,
+        offline: bool = False,
+    ):
+        self.root = root
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.hits = 0
+        self.revalidated = 0
+        self._lock = threading.Lock()
+        self._index_path = os.path.join(root, "index.json")
+        self.index = {}
+        if os.path.exists(self._index_path):
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                self.index = json.load(f)
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.root, "objects", digest[:2], digest)
+
+    def lookup(self, url: str) -> dict | None:
+        entry = self.index.get(url)
+        if entry is None or not os.path.exists(self._object_path(entry["hash"])):
+            return None
+        return entry
+
+    def is_fresh(self, entry: dict) -> bool:
+        if self.offline:
+            return True
+        return self.ttl is not None and time.time() - entry["fetched"] < self.ttl
+
+    def conditional_headers(self, entry: dict) -> dict:
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def load(self, url: str, entry: dict, revalidated: bool = False) -> bytes:
+        """读取缓存内容并更新访问时间；revalidated 表示刚收到 304"""
+        with open(self._object_path(entry["hash"]), "rb") as f:
+            content = f.read()
+        with self._lock:
+            entry["accessed"] = time.time()
+            if revalidated:
+                entry["fetched"] = entry["accessed"]
+                self.revalidated += 1
+            else:
+                self.hits += 1
+        return content
+
+    def store(self, url: str, response: requests.Response) -> None:
+        content = response.content
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(content)
+            os.replace(tmp, path)
+        now = time.time()
+        with self._lock:
+            self.index[url] = {
+                "hash": digest,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "fetched": now,
+                "accessed": now,
+                "size": len(content),
+            }
+
+    def _evict(self) -> None:
+        """超过 max_bytes 时按最近访问时间淘汰，内容被多个 URL 共用时只计一次"""
+        sizes = {e["hash"]: e["size"] for e in self.index.values()}
+        total = sum(sizes.values())
+        if total <= self.max_bytes:
+            return
+        for url, entry in sorted(self.index.items(), key=lambda kv: kv[1]["accessed"]):
+            if total <= self.max_bytes:
+                break
+            del self.index[url]
+            digest = entry["hash"]
+            if any(e["hash"] == digest for e in self.index.values()):
+                continue
+            total -= sizes[digest]
+            try:
+                os.remove(self._object_path(digest))
+            except FileNotFoundError:
+                pass
+
+    def save(self) -> None:
+        with self._lock:
+            self._evict()
+            os.makedirs(self.root, exist_ok=True)
+            tmp = self._index_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.index, f, ensure_ascii=False)
+            os.replace(tmp, self._index_path)
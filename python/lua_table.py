@@ -0,0 +1,319 @@
+import re
+
+# 词法单元：空白/注释、字符串、名字、数字、符号
+TOKEN = re.compile(
+    r"""
+    (?P<ws>(?:\s+|--[^\n]*)+)
+    |(?P<str>"[^"\\\n]*(?:\\.[^"\\\n]*)*"|'[^'\\\n]*(?:\\.[^'\\\n]*)*')
+    |(?P<name>[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)*)
+    |(?P<num>-?(?:0[xX][0-9A-Fa-f]+|\d+(?:\.\d*)?(?:[eE][+-]?\d+)?))
+    |(?P<op>[{}=,;\[\]])
+    """,
+    re.X | re.S,
+)
+
+# 快速路径：一整条只含 key=字符串/数字 的记录，例如 {id="4",category="4",index="100101"}
+_VALUE = r"""(?:"[^"\\\n]*(?:\\.[^"\\\n]*)*"|'[^'\\\n]*(?:\\.[^'\\\n]*)*'|-?\d+(?:\.\d*)?)"""
+_FIELD = rf"[A-Za-z_]\w*\s*=\s*{_VALUE}"
+RECORD = re.compile(
+    rf"\{{\s*(?:{_FIELD}(?:\s*[,;]\s*{_FIELD})*\s*[,;]?\s*)?\}}",
+    re.S,
+)
+# 容器表中紧跟在上一条记录后面的 ",{...}"
+NEXT_RECORD = re.compile(rf"\s*[,;]\s*({RECORD.pattern})", re.S)
+PAIR = re.compile(rf"([A-Za-z_]\w*)\s*=\s*({_VALUE})", re.S)
+# 没有转义和单引号时（绝大多数记录）直接取出引号内的内容
+PLAIN_PAIR = re.compile(r'([A-Za-z_]\w*)\s*=\s*(?:"([^"\n]*)"|(-?\d+(?:\.\d*)?))')
+
+_ESCAPE = re.compile(
+    r"""\\(?:([abfnrtv\\"'\n])|x([0-9A-Fa-f]{2})|(\d{1,3})|u\{([0-9A-Fa-f]+)\}|z\s*)"""
+)
+_SIMPLE_ESCAPES = {
+    "a": "\a",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+    "v": "\v",
+    "\\": "\\",
+    '"': '"',
+    "'": "'",
+    "\n": "\n",
+}
+
+
+class LuaParseError(ValueError):
+    """name.lua 格式错误，带行号和列号（从 1 开始）"""
+
+    def __init__(self, message: str, line: int, column: int):
+        super().__init__(f"{message}（第 {line} 行第 {column} 列）")
+        self.line = line
+        self.column = column
+
+
+def decode_string(token: str) -> str:
+    """去掉引号并处理 Lua 转义，\\ddd 和 \\xhh 按 UTF-8 字节拼接"""
+    body = token[1:-1]
+    if "\\" not in body:
+        return body
+    out = bytearray()
+    last = 0
+    for m in _ESCAPE.finditer(body):
+        out += body[last : m.start()].encode("utf-8")
+        simple, hex_, dec, uni = m.groups()
+        if simple is not None:
+            out += _SIMPLE_ESCAPES[simple].encode("utf-8")
+        elif hex_ is not None:
+            out.append(int(hex_, 16))
+        elif dec is not None:
+            out.append(int(dec) & 0xFF)
+        elif uni is not None:
+            out += chr(int(uni, 16)).encode("utf-8")
+        last = m.end()
+    out += body[last:].encode("utf-8")
+    return out.decode("utf-8", errors="replace")
+
+
+def _scalar(kind: str, text: str) -> str:
+    # 数字按原文保存为字符串，和记录里其它字段保持一致
+    return decode_string(text) if kind == "str" else text
+
+
+def _fields(text: str) -> dict:
+    if "\\" not in text and "'" not in text:
+        return {key: string or number for key, string, number in PLAIN_PAIR.findall(text)}
+    record = {}
+    for key, value in PAIR.findall(text):
+        if value[0] in "\"'":
+            value = value[1:-1] if "\\" not in value else decode_string(value)
+        record[key] = value
+    return record
+
+
+class _Lexer:
+    def __init__(self, fp, chunk_size: int):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.line = 1  # buf[0] 所在的行
+        self.col0 = 1  # buf[0] 所在的列
+        self._peeked = None
+
+    def fill(self) -> bool:
+        if self.eof:
+            return False
+        data = self.fp.read(self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        self.buf += data
+        return True
+
+    def release(self):
+        """丢弃已经解析过的部分，只在记录之间调用，保证出错时还能定位"""
+        if self.pos < self.chunk_size:
+            return
+        consumed = self.buf[: self.pos]
+        newline = consumed.rfind("\n")
+        if newline == -1:
+            self.col0 += len(consumed)
+        else:
+            self.line += consumed.count("\n")
+            self.col0 = len(consumed) - newline
+        self.buf = self.buf[self.pos :]
+        self.pos = 0
+
+    def where(self, pos: int) -> tuple[int, int]:
+        newlines = self.buf.count("\n", 0, pos)
+        if newlines == 0:
+            return self.line, self.col0 + pos
+        return self.line + newlines, pos - self.buf.rfind("\n", 0, pos)
+
+    def error(self, message: str, pos: int) -> LuaParseError:
+        return LuaParseError(message, *self.where(pos))
+
+    def token(self) -> tuple[str, str, int]:
+        """返回 (类型, 原文, 位置)，文件结束时类型为 eof"""
+        if self._peeked is not None:
+            tok, self._peeked = self._peeked, None
+            return tok
+        while True:
+            # 除了带续行的字符串，单元不会跨行；先保证缓冲区里有完整的一行，避免单元被读取块截断
+            if not self.eof and self.buf.find("\n", self.pos) == -1:
+                self.fill()
+                continue
+            m = TOKEN.match(self.buf, self.pos)
+            if (m is None or m.end() == len(self.buf)) and self.fill():
+                continue
+            if m is None:
+                if self.pos >= len(self.buf):
+                    return "eof", "", self.pos
+                quote = self.buf[self.pos] in "\"'"
+                raise self.error(
+                    "字符串没有结束" if quote else f"无法识别的字符 {self.buf[self.pos]!r}",
+                    self.pos,
+                )
+            self.pos = m.end()
+            kind = m.lastgroup
+            if kind != "ws":
+                return kind, m.group(kind), m.start()
+
+    def peek(self) -> tuple[str, str, int]:
+        if self._peeked is None:
+            self._peeked = self.token()
+        return self._peeked
+
+    def match_record(self, start: int) -> dict | None:
+        """快速路径：从 start 处的 { 一次匹配整条简单记录"""
+        while self.buf.find("}", start) == -1 and self.fill():
+            pass
+        m = RECORD.match(self.buf, start)
+        if m is None:
+            return None
+        self.pos = m.end()
+        return _fields(m.group())
+
+    def match_following(self):
+        """快速路径：连续读取容器表中紧跟着的简单记录，遇到其它内容时停下交给逐词解析"""
+        while True:
+            if not self.eof and self.buf.find("\n", self.pos) == -1:
+                self.fill()
+                continue
+            m = NEXT_RECORD.match(self.buf, self.pos)
+            if m is None or (m.end() == len(self.buf) and not self.eof):
+                if m is not None and self.fill():
+                    continue
+                return
+            self.pos = m.end()
+            yield _fields(m.group(1))
+            self.release()
+
+    def skip_char(self):
+        """出错后跳过一个字符；未结束的字符串直接跳到行尾"""
+        if self.buf[self.pos : self.pos + 1] in ("\"", "'"):
+            end = self.buf.find("\n", self.pos)
+            self.pos = end if end != -1 else len(self.buf)
+        else:
+            self.pos += 1
+
+
+def _expect(lex: _Lexer, value: str):
+    kind, text, pos = lex.token()
+    if text != value or kind not in ("op", "name"):
+        raise lex.error(f"应为 {value!r}，实际为 {text or '文件结尾'!r}", pos)
+
+
+def _skip_table(lex: _Lexer, line: int) -> bool:
+    """出错后跳过当前表剩余的部分，直到和它配对的 }
+
+    未结束的字符串会吞掉同一行后面的内容（可能包括这条记录的 }），所以出错的行之后在同一层
+    遇到新一行的 { 时认为是下一条记录的开始：停在它前面并返回 True，由外层继续解析。
+    """
+    depth = 1
+    while depth:
+        try:
+            kind, text, pos = lex.token()
+        except LuaParseError:
+            lex.skip_char()
+            continue
+        if kind == "eof":
+            return False
+        if text == "{":
+            if depth == 1 and lex.where(pos)[0] > line:
+                lex.pos = pos
+                return True
+            depth += 1
+        elif text == "}":
+            depth -= 1
+    return False
+
+
+def _table(lex: _Lexer, start: int, on_error):
+    """解析 { 之后的内容；字段全是 key=标量 的表作为一条记录返回，其它表只返回其中的记录
+
+    返回 True 表示这个表出错后停在了下一条记录的 { 前面（见 _skip_table）。
+    """
+    record = lex.match_record(start)
+    if record is not None:
+        if record:
+            yield record
+        return False
+    lex._peeked = None
+    lex.pos = start + 1
+    fields = {}
+    is_record = True
+    try:
+        kind, text, pos = lex.token()
+        while text != "}":
+            if kind == "eof":
+                raise lex.error("表没有结束，缺少 }", pos)
+            resynced = False
+            if kind == "name" and lex.peek()[1] == "=":
+                lex.token()
+                vkind, vtext, vpos = lex.token()
+                if vtext == "{":
+                    is_record = False
+                    resynced = yield from _table(lex, vpos, on_error)
+                elif vkind in ("str", "num", "name"):
+                    fields[text] = _scalar(vkind, vtext)
+                else:
+                    raise lex.error(f"{text} 缺少值", vpos)
+            elif text == "{":
+                is_record = False
+                resynced = yield from _table(lex, pos, on_error)
+                lex.release()
+                if not resynced:
+                    yield from lex.match_following()
+            elif text == "[":
+                # [key]=value 形式的字段，不算记录
+                is_record = False
+                lex.token()
+                _expect(lex, "]")
+                _expect(lex, "=")
+                vkind, vtext, vpos = lex.token()
+                if vtext == "{":
+                    resynced = yield from _table(lex, vpos, on_error)
+            elif kind in ("str", "num", "name"):
+                is_record = False
+            else:
+                raise lex.error(f"意外的 {text!r}", pos)
+            kind, text, pos = lex.token()
+            if text in (",", ";"):
+                kind, text, pos = lex.token()
+            elif text != "}" and not resynced:
+                raise lex.error(f"字段之间缺少逗号，遇到 {text or '文件结尾'!r}", pos)
+    except LuaParseError as e:
+        if on_error is None:
+            raise
+        on_error(e)
+        lex._peeked = None
+        return _skip_table(lex, e.line)
+    if is_record and fields:
+        yield fields
+    return False
+
+
+def iter_records(fp, on_error=None, chunk_size: int = 1 << 16):
+    """单次流式读取 Lua 表文件，逐条返回记录 dict
+
+    fp 是文本文件对象。记录可以跨行，字符串支持转义。遇到格式错误时，
+    on_error 为 None 则抛出 LuaParseError，否则调用 on_error(err) 并跳过这条记录继续。
+    """
+    lex = _Lexer(fp, chunk_size)
+    while True:
+        lex.release()
+        kind, text, pos = lex.token()
+        if kind == "eof":
+            return
+        if text == "{":
+            yield from _table(lex, pos, on_error)
+        elif text in ("local", "return", "=", ",", ";") or kind in ("name", "str", "num"):
+            continue
+        else:
+            error = lex.error(f"意外的 {text!r}", pos)
+            if on_error is None:
+                raise error
+            on_error(error)
@@ -1,45 +1,106 @@
+import argparse
+import copy
+import hashlib
 import json
+import os
 
+import artifacts
+import conditions
+import metrics
+import skill_delta
+import skill_shards
 from umas import GameDatabase
 
-db = GameDatabase("python/name.lua", "name.json")
+# 合并规则或增量状态的格式变化时加一，旧的增量状态会失效
+MERGE_VERSION = 3
+# 三个输入的名称，state 中按这个名称分别记录文件和每个技能的哈希
+SOURCES = ("rets", "other", "patch")
 
-with open("rets.json", encoding="utf-8") as f:
-    rets = json.load(f)
 
-with open("uma-skill-tools\data\skill_data.json", encoding="utf-8") as f:
-    other = json.load(f)
+def _normalize(value):
+    """去掉 condition 中的空格，用于计算哈希"""
+    if isinstance(value, dict):
+        return {
+            k: v.replace(" ", "") if k == "condition" and isinstance(v, str) else _normalize(v)
+            for k, v in value.items()
+        }
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    return value
 
-failed_items = []  # 用来收集所有失败跳过的 key/name
 
-for key in rets:
-    if key not in other:
-        continue
-    name = db.get_name(category="47", index=key)
-    rets_alts = rets[key]["alternatives"]
-    other_alts = other[key]["alternatives"]
+def skill_hash(*values) -> str:
+    text = json.dumps(
+        [_normalize(v) for v in values],
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def load_with_digest(path):
+    """读取 JSON 文件，同时返回文件内容的哈希，供 MergeEngine.run 判断整个文件有没有变"""
+    with open(path, "rb") as f:
+        body = f.read()
+    return json.loads(body), hashlib.sha1(body).hexdigest()
+
+
+def file_digest(path) -> str | None:
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def check_condition(condition, record, **fields):
+    """新写入的条件里有 simulator 不认识的变量时记录下来"""
+    if not isinstance(condition, str):
+        return
+    try:
+        unknown = conditions.validate(condition)
+    except conditions.ConditionError as e:
+        record("invalid_condition", condition=condition, error=str(e), **fields)
+        return
+    if unknown:
+        record("unknown_variable", condition=condition, variables=unknown, **fields)
+
+
+def merge_skill(key: str, name: str, rets_skill: dict, other_skill: dict):
+    """用国服数据 rets_skill 修正上游的 other_skill
+
+    不修改传入的对象，返回 (合并结果, 修改记录, 是否失败)。失败时合并结果可能只修正了一部分，
+    和以前逐条 print 的行为一致。
+    """
+    merged = copy.deepcopy(other_skill)
+    changes = []
+    failed = False
+
+    def record(kind, **fields):
+        changes.append({"key": key, "name": name, "kind": kind, **fields})
+
+    def fail(reason, **fields):
+        nonlocal failed
+        failed = True
+        record("failure", reason=reason, **fields)
+
+    rets_alts = rets_skill["alternatives"]
+    other_alts = merged["alternatives"]
 
     if len(rets_alts) != len(other_alts):
         if len(rets_alts) == 1 and len(other_alts) == 2:
             ra_cond = rets_alts[0].get("condition")
-            new_other_alts = [oa for oa in other_alts if oa.get("condition") == ra_cond]
-            if len(new_other_alts) == 1:
-                print(
-                    f"[alts删去多余条目] key={key}, name={name}, 保留 {len(new_other_alts)} 条与 rets 条件相同的"
-                )
-            else:
-                print(
-                    f"[失败][alts不一致过多] key={key}, name={name}, 保留 {len(new_other_alts)} 条与 rets 条件相同的"
-                )
-                failed_items.append((key, name))
-                continue
-            other[key]["alternatives"] = new_other_alts
+            new_other_alts = [
+                oa for oa in other_alts if conditions.equivalent(oa.get("condition"), ra_cond)
+            ]
+            if len(new_other_alts) != 1:
+                fail("alts不一致过多", kept=len(new_other_alts))
+                return merged, changes, failed
+            record("alternatives_pruned", old=len(other_alts), new=len(new_other_alts))
+            merged["alternatives"] = other_alts = new_other_alts
         else:
-            print(
-                f"[失败][alts数量不一致] key={key}, name={name}, rets={len(rets_alts)}, other={len(other_alts)}, 跳过"
-            )
-            failed_items.append((key, name))
-            continue
+            fail("alts数量不一致", rets=len(rets_alts), other=len(other_alts))
+            return merged, changes, failed
 
     # 比较 condition
     diff_conditions = []
@@ -55,25 +116,34 @@ for key in rets:
             if isinstance(oa.get("condition"), list)
             else [oa.get("condition")]
         )
-        if rc_list != oc_list:
+        # 按条件的语义比较，只有项的顺序不同时不算修改
+        if len(rc_list) != len(oc_list) or not all(
+            conditions.equivalent(rc, oc) for rc, oc in zip(rc_list, oc_list)
+        ):
             diff_conditions.append(i)
 
     if len(diff_conditions) == 1:
         idx = diff_conditions[0]
-        print(f"[条件修改] key={key}, name={name}, alternatives index={idx}")
-        print(f"  old condition: {other_alts[idx].get('condition')}")
-        print(f"  new condition: {rets_alts[idx].get('condition')}")
+        record(
+            "condition",
+            alt=idx,
+            old=other_alts[idx].get("condition"),
+            new=rets_alts[idx].get("condition"),
+        )
         other_alts[idx]["condition"] = rets_alts[idx]["condition"]
+        check_condition(rets_alts[idx]["condition"], record, alt=idx)
     elif len(diff_conditions) > 1:
-        print(f"[失败][多个条件不一致，跳过] key={key}, name={name}, 不处理")
-        failed_items.append((key, name))
-        continue
+        fail("多个条件不一致", alts=diff_conditions)
+        return merged, changes, failed
 
     # 对齐 baseDuration 和 effects modifier
     for i, (ra, oa) in enumerate(zip(rets_alts, other_alts)):
         if ra.get("baseDuration") != oa.get("baseDuration"):
-            print(
-                f"[baseDuration修改] key={key}, name={name}, alternatives index={i}, {oa.get('baseDuration')} -> {ra.get('baseDuration')}"
+            record(
+                "baseDuration",
+                alt=i,
+                old=oa.get("baseDuration"),
+                new=ra.get("baseDuration"),
             )
             oa["baseDuration"] = ra.get("baseDuration")
 
@@ -85,78 +155,290 @@ for key in rets:
                 ra_types = {re.get("type") for re in ra_effects}
                 new_oa_effects = [oe for oe in oa_effects if oe.get("type") in ra_types]
                 if len(new_oa_effects) == len(ra_types):
-                    print(
-                        f"[effects删去多余条目] key={key}, name={name}, alternatives index={i}, 原长度={len(oa_effects)}, 新长度={len(new_oa_effects)}"
+                    record(
+                        "effects_pruned",
+                        alt=i,
+                        old=len(oa_effects),
+                        new=len(new_oa_effects),
                     )
                 else:
-                    print(
-                        f"[失败][effects不一致过多] key={key}, name={name}, alternatives index={i}, rets={len(ra_effects)}, other={len(oa_effects)}"
+                    fail(
+                        "effects不一致过多",
+                        alt=i,
+                        rets=len(ra_effects),
+                        other=len(oa_effects),
                     )
-                    failed_items.append((key, name))
                 oa_effects = new_oa_effects
-                other[key]["alternatives"][i]["effects"] = oa_effects
+                oa["effects"] = oa_effects
             else:
-                print(
-                    f"[失败][effects长度不一致] key={key}, name={name}, alternatives index={i}, rets={len(ra_effects)}, other={len(oa_effects)}"
+                fail(
+                    "effects长度不一致",
+                    alt=i,
+                    rets=len(ra_effects),
+                    other=len(oa_effects),
                 )
-                failed_items.append((key, name))
                 continue
 
         for j, (re, oe) in enumerate(zip(ra_effects, oa_effects)):
             if re.get("modifier") != oe.get("modifier") and re.get("type") == oe.get(
                 "type"
             ):
-                print(
-                    f"[modifier修改] key={key}, name={name}, alternatives index={i}, effect index={j}, {oe.get('modifier')} -> {re.get('modifier')}"
+                record(
+                    "modifier",
+                    alt=i,
+                    effect=j,
+                    old=oe.get("modifier"),
+                    new=re.get("modifier"),
                 )
                 oe["modifier"] = re.get("modifier")
 
-# 最后统一打印所有失败跳过的条目
-if failed_items:
-    print("\n===== 所有失败跳过的 key/name =====")
-    for k, n in failed_items:
-        print(f"{k} : {n}")
-
-# 读取 custom_patch
-with open("custom_patch.json", "r", encoding="utf-8") as f:
-    custom_patch = json.load(f)
-
-for key, value in custom_patch.items():
-    alts = value["alternatives"]
-    for alt in alts:
-        cond = alt.get("condition")
-        alt["condition"] = cond.replace(" ", "")
-
-    other[key] = value
-
-with open("umalator-cn\skill_data.json", "w", encoding="utf-8") as f:
-    json.dump(other, f, ensure_ascii=False, indent=4)
-
-print("[INFO] custom_patch 已经强制应用到 other 并保存。")
-# 更新 failed_items：去掉被 custom_patch 修复的 key
-still_failed_items = [(k, n) for k, n in failed_items if k not in custom_patch]
-
-# 打印仍然失败的条目
-if still_failed_items:
-    print("\n===== 仍然失败跳过的 key/name =====")
-    for k, n in still_failed_items:
-        print(f"{k} : {n}")
-else:
-    print("\n===== 所有失败条目已被 custom_patch 修复 =====")
-
-# 运行之后 失败：
-# ===== 所有失败跳过的 key/name =====
-# 100231 : ∴win Q.E.D.
-# 900331 : 双生流星
-# 110241 : 绚丽☆演习
-# 900231 : ∴win Q.E.D.
-# 910241 : 绚丽☆演习
-# 100331 : 双生流星
-# 100161 : Shadow Break
-# 900161 : Shadow Break
-# 900261 : G00 1st.F∞；
-# 100371 : Schwarzes Schwert
-# 900281 : I'M☆FULL☆SPEED！！
-# 100281 : I'M☆FULL☆SPEED！！
-# 100261 : G00 1st.F∞；
-# 900371 : Schwarzes Schwert
+    return merged, changes, failed
+
+
+def apply_custom_patch(value: dict) -> dict:
+    """custom_patch 整条覆盖，condition 去掉空格"""
+    value = copy.deepcopy(value)
+    for alt in value["alternatives"]:
+        alt["condition"] = alt.get("condition").replace(" ", "")
+    return value
+
+
+def merge_keys(other: dict, custom_patch: dict) -> list:
+    """输出中技能的顺序：上游的技能在前，只在 custom_patch 中出现的技能在后"""
+    return list(other) + [k for k in custom_patch if k not in other]
+
+
+class MergeEngine:
+    """增量合并：按技能的输入哈希跳过上次已经合并过且没有变化的技能
+
+    state_path 记录三个输入文件和上次输出文件的哈希（files），以及每个技能在各输入中的
+    哈希、输出哈希和修改记录（skills）。run 只对内容变化了的输入文件逐条计算哈希；上次的
+    输出文件没被改过时直接相信记录的输出哈希，否则逐条核对后才复用。
+    """
+
+    def __init__(self, state_path: str = "merge_state.json"):
+        self.state_path = state_path
+        self.state = {}
+        self.files = {}
+        if os.path.exists(state_path):
+            with open(state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("version") == MERGE_VERSION:
+                self.state = state["skills"]
+                self.files = state["files"]
+        self.recomputed = []
+
+    def run(
+        self,
+        rets: dict,
+        other: dict,
+        custom_patch: dict,
+        previous: dict | None = None,
+        name_of=lambda key: key,
+        digests: dict | None = None,
+    ):
+        """返回 (合并后的技能数据, 变更集)；previous 是上次输出的技能数据
+
+        digests 为 {"rets", "other", "patch", "output"} 各文件内容的哈希（见 load_with_digest），
+        没有给出的视为已经变化。全部和上次相同时不做逐条比较，直接返回 previous。
+        """
+        previous = previous or {}
+        digests = digests or {}
+        self.recomputed = []
+        keys = merge_keys(other, custom_patch)
+        changed = {s for s in SOURCES if digests.get(s) is None or digests[s] != self.files.get(s)}
+        trusted = digests.get("output") is not None and digests["output"] == self.files.get("output")
+        self.files = {s: digests.get(s) for s in SOURCES}
+
+        if not changed and trusted and all(k in previous and k in self.state for k in keys):
+            # 输出文件按键排序写出，这里按 keys 恢复顺序，不需要逐条计算哈希
+            return {key: previous[key] for key in keys}, self.changeset(keys, custom_patch, name_of)
+
+        result = {}
+        new_state = {}
+        for key in keys:
+            inputs = dict(zip(SOURCES, (rets.get(key), other.get(key), custom_patch.get(key))))
+            cached = self.state.get(key)
+            reuse = (
+                cached is not None
+                and key in previous
+                and all(skill_hash(inputs[s]) == cached["input"][s] for s in changed)
+                and (trusted or skill_hash(previous[key]) == cached["output"])
+            )
+            if reuse:
+                result[key] = previous[key]
+                new_state[key] = cached
+            else:
+                self.recomputed.append(key)
+                result[key], new_state[key] = self._merge_state(key, inputs, name_of)
+
+        self.state = new_state
+        return result, self.changeset(keys, custom_patch, name_of)
+
+    def update(self, keys, rets, other, custom_patch, result: dict, name_of=lambda key: key):
+        """只重新合并 keys 中的技能，直接修改 result（上次 run / update 的结果）
+
+        供常驻的 watch 使用：调用方已经知道哪些技能的输入变了，不用再逐个计算哈希比较。
+        返回新的 result，技能的顺序和 run 一致。
+        """
+        self.recomputed = []
+        # 输入文件已经和上次 run 时不同，下次 run 要逐条比较
+        self.files = {}
+        for key in keys:
+            inputs = dict(zip(SOURCES, (rets.get(key), other.get(key), custom_patch.get(key))))
+            if inputs["other"] is None and inputs["patch"] is None:
+                result.pop(key, None)
+                self.state.pop(key, None)
+                continue
+            self.recomputed.append(key)
+            result[key], self.state[key] = self._merge_state(key, inputs, name_of)
+        order = merge_keys(other, custom_patch)
+        if list(result) != order:
+            result = {key: result[key] for key in order}
+        return result
+
+    def changeset(self, keys, custom_patch: dict, name_of=lambda key: key) -> dict:
+        """根据 state 中各技能的修改记录生成变更集"""
+        changes = []
+        failures = []
+        for key in keys:
+            cached = self.state[key]
+            changes.extend(cached["changes"])
+            if cached["failed"]:
+                failures.append({"key": key, "name": name_of(key)})
+        return {
+            "changes": changes,
+            "failures": failures,
+            "patched": [k for k in custom_patch],
+            "still_failed": [f for f in failures if f["key"] not in custom_patch],
+        }
+
+    def _merge_state(self, key, inputs: dict, name_of):
+        entry, changes, failed = self._merge_one(key, *inputs.values(), name_of)
+        return entry, {
+            "input": {source: skill_hash(value) for source, value in inputs.items()},
+            "output": skill_hash(entry),
+            "changes": changes,
+            "failed": failed,
+        }
+
+    def _merge_one(self, key, rets_skill, other_skill, patch, name_of):
+        changes = []
+        failed = False
+        entry = other_skill
+        if rets_skill is not None and other_skill is not None:
+            entry, changes, failed = merge_skill(key, name_of(key), rets_skill, other_skill)
+        if patch is not None:
+            entry = apply_custom_patch(patch)
+            changes = changes + [{"key": key, "name": name_of(key), "kind": "custom_patch"}]
+
+            def record(kind, **fields):
+                changes.append({"key": key, "name": name_of(key), "kind": kind, **fields})
+
+            for i, alt in enumerate(entry["alternatives"]):
+                check_condition(alt.get("condition"), record, alt=i)
+        return entry, changes, failed
+
+    def save(self):
+        with open(self.state_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": MERGE_VERSION, "files": self.files, "skills": self.state},
+                f,
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+
+
+def _load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rets", default="rets.json")
+    parser.add_argument("--upstream", default="uma-skill-tools/data/skill_data.json")
+    parser.add_argument("--patch", default="custom_patch.json")
+    parser.add_argument("--output", default="umalator-cn/skill_data.json")
+    parser.add_argument("--changes", default="merge_changes.json", help="机器可读的变更集")
+    parser.add_argument("--state", default="merge_state.json", help="增量合并状态")
+    parser.add_argument("--full", action="store_true", help="忽略增量状态，全部重新合并")
+    parser.add_argument("--verbose", action="store_true", help="逐条打印修改")
+    parser.add_argument("--shards", default="", help="同时输出分片到此目录，空字符串为不输出")
+    parser.add_argument("--shard-by", choices=["group", "range"], default="group")
+    parser.add_argument("--meta", default="umalator-cn/skill_meta.json", help="按 group 分片时使用")
+    parser.add_argument(
+        "--conditions", default="", help="同时输出条件去重后的技能数据到此文件，空字符串为不输出"
+    )
+    parser.add_argument(
+        "--deltas", default="", help="同时输出继承技写成差分的技能数据到此文件，空字符串为不输出"
+    )
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+
+    with metrics.run("merge", args.metrics, args.profile):
+        with metrics.span("load"):
+            db = GameDatabase("python/name.lua", "name.json")
+            rets, rets_digest = load_with_digest(args.rets)
+            other, other_digest = load_with_digest(args.upstream)
+            custom_patch, patch_digest = load_with_digest(args.patch)
+            digests = {"rets": rets_digest, "other": other_digest, "patch": patch_digest}
+            previous = None
+            if not args.full and os.path.exists(args.output):
+                previous, digests["output"] = load_with_digest(args.output)
+
+        engine = MergeEngine(args.state)
+        if args.full:
+            engine.state = {}
+        with metrics.span("merge"):
+            merged, changeset = engine.run(
+                rets,
+                other,
+                custom_patch,
+                previous=previous,
+                name_of=lambda key: db.get_name(category="47", index=key),
+                digests=digests,
+            )
+
+        with metrics.span("write"):
+            artifacts.emit(merged, args.output)
+            engine.files["output"] = file_digest(args.output)
+        if args.conditions:
+            with metrics.span("write.conditions"):
+                table = conditions.ConditionTable()
+                artifacts.emit(table.to_json(merged), args.conditions)
+            print(f"[INFO] 共 {len(table.conditions)} 个不同的条件，写入 {args.conditions}")
+        if args.deltas:
+            with metrics.span("write.deltas"):
+                delta_data = skill_delta.write(merged, args.deltas)
+            deltas = sum(1 for e in delta_data["skills"].values() if skill_delta.BASE in e)
+            metrics.count("skills.delta_encoded", deltas)
+            print(f"[INFO] {deltas} 个继承技写成差分，写入 {args.deltas}")
+        if args.shards:
+            with metrics.span("write.shards"):
+                meta = _load(args.meta) if args.shard_by == "group" else None
+                index = skill_shards.shard(merged, args.shards, args.shard_by, meta)
+            print(f"[INFO] 拆分为 {len(index['shards'])} 个分片，写入 {args.shards}")
+        with open(args.changes, "w", encoding="utf-8") as f:
+            json.dump(changeset, f, ensure_ascii=False, indent=2)
+        engine.save()
+
+        if args.verbose:
+            for c in changeset["changes"]:
+                print(json.dumps(c, ensure_ascii=False))
+        kinds = {}
+        for c in changeset["changes"]:
+            kinds[c["kind"]] = kinds.get(c["kind"], 0) + 1
+            metrics.count(f"changes.{c['kind']}")
+        metrics.count("skills.recomputed", len(engine.recomputed))
+        metrics.count("skills.reused", len(merged) - len(engine.recomputed))
+        metrics.count("skills.failed", len(changeset["still_failed"]))
+        print(f"[INFO] 重新合并 {len(engine.recomputed)} / {len(merged)} 个技能，修改统计：{kinds}")
+        print(f"[INFO] 变更集已写入 {args.changes}")
+        # 打印仍然失败的条目
+        if changeset["still_failed"]:
+            print("\n===== 仍然失败跳过的 key/name =====")
+            for f in changeset["still_failed"]:
+                print(f"{f['key']} : {f['name']}")
+        else:
+            print("\n===== 所有失败条目已被 custom_patch 修复 =====")
@@ -0,0 +1,182 @@
+"""运行指标：各阶段耗时、每个请求的统计、计数器和内存峰值
+
+脚本在 __main__ 中用 metrics.run() 包住整个运行过程，其余代码通过模块级函数记录：
+
+    with metrics.span("parse"):
+        ...
+    metrics.count("skills.parsed")
+
+运行结束时把结果写入 JSON 文件（默认 .metrics/<脚本名>-<时间>.json），
+指定 --profile 时同时用 cProfile 记录并保存 pstats 文件。没有调用 run() 时记录也会保留在
+内存中，不会写文件。
+"""
+
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+METRICS_DIR = ".metrics"
+
+
+def peak_rss_kb() -> float | None:
+    """进程的内存峰值（KiB），Windows 上没有 resource 模块时返回 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 的单位是字节，Linux 是 KiB
+    return peak / 1024 if sys.platform == "darwin" else float(peak)
+
+
+def _percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+class Metrics:
+    def __init__(self, name: str = ""):
+        self.name = name
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.spans = []
+        self.counters = {}
+        self.requests = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name: str, **fields):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.spans.append(
+                    {
+                        "name": name,
+                        "start": start - self._t0,
+                        "duration": end - start,
+                        **fields,
+                    }
+                )
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def request(self, url: str, latency: float, **fields):
+        """fields 为 status、bytes、retries、source（network / cache / revalidated）、error"""
+        with self._lock:
+            self.requests.append({"url": url, "latency": latency, **fields})
+
+    def summary(self) -> dict:
+        stages = {}
+        for s in self.spans:
+            stage = stages.setdefault(s["name"], {"count": 0, "total": 0.0, "max": 0.0})
+            stage["count"] += 1
+            stage["total"] += s["duration"]
+            stage["max"] = max(stage["max"], s["duration"])
+
+        latencies = [r["latency"] for r in self.requests]
+        statuses, sources = {}, {}
+        for r in self.requests:
+            status = str(r.get("status"))
+            statuses[status] = statuses.get(status, 0) + 1
+            source = r.get("source", "network")
+            sources[source] = sources.get(source, 0) + 1
+        return {
+            "elapsed": time.perf_counter() - self._t0,
+            "stages": stages,
+            "requests": {
+                "count": len(self.requests),
+                "bytes": sum(r.get("bytes", 0) for r in self.requests),
+                "retries": sum(r.get("retries", 0) for r in self.requests),
+                "errors": sum(1 for r in self.requests if r.get("error")),
+                "status": statuses,
+                "source": sources,
+                "latency_p50": _percentile(latencies, 0.5),
+                "latency_p95": _percentile(latencies, 0.95),
+                "latency_max": max(latencies, default=None),
+            },
+            "counters": dict(self.counters),
+            "peak_rss_kb": peak_rss_kb(),
+        }
+
+    def to_json(self) -> dict:
+        return {
+            "name": self.name,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "argv": sys.argv,
+            "summary": self.summary(),
+            "spans": self.spans,
+            "requests": self.requests,
+        }
+
+    def write(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f, ensure_ascii=False, indent=2)
+
+
+current = Metrics()
+
+
+def span(name: str, **fields):
+    return current.span(name, **fields)
+
+
+def count(name: str, n: int = 1):
+    current.count(name, n)
+
+
+def request(url: str, latency: float, **fields):
+    current.request(url, latency, **fields)
+
+
+def default_path(name: str) -> str:
+    return os.path.join(METRICS_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+
+
+def add_arguments(parser):
+    """给脚本加上 --metrics 和 --profile 参数"""
+    parser.add_argument(
+        "--metrics", default=None, help="指标输出文件，默认写入 .metrics/，空字符串为不写"
+    )
+    parser.add_argument("--profile", default="", help="用 cProfile 记录并把 pstats 写入此文件")
+
+
+@contextlib.contextmanager
+def run(name: str, metrics_path: str | None = None, profile_path: str = ""):
+    """记录一次运行，结束时（包括出错时）写出指标文件"""
+    global current
+    current = Metrics(name)
+    profiler = cProfile.Profile() if profile_path else None
+    if profiler:
+        profiler.enable()
+    try:
+        with current.span("total"):
+            yield current
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(15)
+            print(out.getvalue())
+        if metrics_path is None:
+            metrics_path = default_path(name)
+        if metrics_path:
+            current.write(metrics_path)
+            print(f"[metrics] {metrics_path}")
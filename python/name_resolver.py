@@ -0,0 +1,135 @@
+"""name.lua 名称的模糊匹配
+
+wiki 上的写法和 name.lua 经常有细微差别：全角/半角标点、☆/★、空格、繁体字等。
+先把名称规范化（NFKC、去空白、统一星号和间隔号、小写），规范化后完全相同且唯一的直接命中；
+否则只用字符二元组的倒排索引列出候选（按 Dice 系数排序）供人工确认，不自动采用。CN/TW/JP 三种文本都建索引，
+繁体写法可以通过 TW 文本匹配上。
+"""
+
+import unicodedata
+from typing import NamedTuple
+
+LANGS = ("CN", "TW", "JP")
+
+# NFKC 之后仍然需要统一的字符
+_FOLD = str.maketrans(
+    {
+        "★": "☆",
+        "・": "·",
+        "•": "·",
+        "‧": "·",
+        "･": "·",
+        "〜": "~",
+        "～": "~",
+        "—": "-",
+        "－": "-",
+        "‐": "-",
+        "「": "",
+        "」": "",
+        "『": "",
+        "』": "",
+        "“": '"',
+        "”": '"',
+        "‘": "'",
+        "’": "'",
+    }
+)
+
+
+class Candidate(NamedTuple):
+    index: str
+    lang: str
+    text: str
+    score: float
+
+
+def fold(text: str) -> str:
+    """规范化：NFKC（全角转半角等）、统一符号、去掉空白、小写"""
+    text = unicodedata.normalize("NFKC", text).translate(_FOLD)
+    return "".join(text.split()).lower()
+
+
+def grams(text: str) -> set[str]:
+    """字符二元组；只有一个字符时用这个字符本身"""
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i : i + 2] for i in range(len(text) - 1)}
+
+
+class NameResolver:
+    """按 category 查询的模糊名称索引"""
+
+    def __init__(self, records, skip_inherited=True):
+        """records 为 name.lua 的记录（含 category、index、text_CN/TW/JP）"""
+        self.entries = []  # (category, index, lang, text, folded, gram 数)
+        self.exact = {}  # (category, folded) -> [entry]
+        self.postings = {}  # (category, gram) -> [entry]
+        for item in records:
+            index = item.get("index")
+            category = item.get("category")
+            if not index or not category:
+                continue
+            if skip_inherited and index[0] == "9":
+                continue  # 和 get_id 一样跳过继承技，调用方再换成 9 开头的 id
+            seen = set()
+            for lang in LANGS:
+                text = item.get(f"text_{lang}")
+                if not text:
+                    continue
+                folded = fold(text)
+                if not folded or folded in seen:
+                    continue
+                seen.add(folded)
+                entry = len(self.entries)
+                g = grams(folded)
+                self.entries.append((category, index, lang, text, folded, len(g)))
+                self.exact.setdefault((category, folded), []).append(entry)
+                for gram in g:
+                    self.postings.setdefault((category, gram), []).append(entry)
+
+    def _candidate(self, entry, score) -> Candidate:
+        _, index, lang, text, _, _ = self.entries[entry]
+        return Candidate(index, lang, text, score)
+
+    def search(self, category: str, name: str, limit=5, min_score=0.5) -> list[Candidate]:
+        """按得分从高到低返回候选，同一个 index 只保留得分最高的一条"""
+        folded = fold(name)
+        if not folded:
+            return []
+        exact = self.exact.get((category, folded))
+        if exact:
+            scored = {e: 1.0 for e in exact}
+        else:
+            query = grams(folded)
+            hits = {}
+            for gram in query:
+                for entry in self.postings.get((category, gram), ()):
+                    hits[entry] = hits.get(entry, 0) + 1
+            scored = {}
+            for entry, common in hits.items():
+                score = 2 * common / (len(query) + self.entries[entry][5])
+                if score >= min_score:
+                    scored[entry] = score
+
+        best = {}
+        for entry, score in sorted(scored.items(), key=lambda kv: (-kv[1], kv[0])):
+            index = self.entries[entry][1]
+            if index not in best:
+                best[index] = self._candidate(entry, score)
+            if len(best) >= limit:
+                break
+        return list(best.values())
+
+    def resolve(self, category: str, name: str) -> Candidate | None:
+        """规范化后完全相同、且只对应一个 index 时返回这个候选，否则返回 None
+
+        二元组打分只用于列出候选：○/◎/×、“非”等标记只差一个字，得分很高却是另一个技能，
+        所以不自动采用。
+        """
+        folded = fold(name)
+        entries = self.exact.get((category, folded)) if folded else None
+        if not entries:
+            return None
+        if len({self.entries[e][1] for e in entries}) != 1:
+            return None
+        return self._candidate(entries[0], 1.0)
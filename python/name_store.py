@@ -0,0 +1,151 @@
+import json
+import sqlite3
+
+from umas import iter_records, source_hash, source_signature
+
+LANGS = ("CN", "TW", "JP")
+
+# 表结构变化时加一，旧数据库会被自动重建
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE texts (
+    category TEXT NOT NULL,
+    idx TEXT NOT NULL,
+    text_JP TEXT NOT NULL DEFAULT '',
+    text_TW TEXT NOT NULL DEFAULT '',
+    text_CN TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (category, idx)
+) WITHOUT ROWID;
+CREATE INDEX texts_cn ON texts (category, text_CN);
+CREATE INDEX texts_tw ON texts (category, text_TW);
+CREATE INDEX texts_jp ON texts (category, text_JP);
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+
+def _column(lang: str) -> str:
+    if lang not in LANGS:
+        raise ValueError(f"未知语言：{lang}，可选 {LANGS}")
+    return f"text_{lang}"
+
+
+class NameStore:
+    """基于 SQLite 的 name.lua 查询，和 GameDatabase 接口相同，另外支持多语言和批量查询
+
+    数据库文件在 name.lua 变化时自动重建，查询不需要把整个表读进内存。
+    与 GameDatabase 不同，反向查询也包含 9xxxxx 继承技能。
+    """
+
+    def __init__(self, source_path: str, db_path: str | None = None):
+        self.source_path = source_path
+        self.db_path = db_path or source_path + ".sqlite"
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        if not self._is_current():
+            self._rebuild()
+
+    def _meta(self) -> dict:
+        try:
+            return dict(self.conn.execute("SELECT key, value FROM meta"))
+        except sqlite3.OperationalError:
+            return {}
+
+    def _is_current(self) -> bool:
+        meta = self._meta()
+        if meta.get("version") != str(SCHEMA_VERSION):
+            return False
+        stat = json.dumps(source_signature(self.source_path))
+        if meta.get("stat") == stat:
+            return True
+        if meta.get("sha256") != source_hash(self.source_path):
+            return False
+        with self.conn:
+            self.conn.execute("UPDATE meta SET value = ? WHERE key = 'stat'", (stat,))
+        return True
+
+    def _rebuild(self):
+        with self.conn:
+            for (name,) in self.conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            ).fetchall():
+                self.conn.execute(f"DROP TABLE {name}")
+            self.conn.executescript(SCHEMA)
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO texts VALUES (?, ?, ?, ?, ?)",
+                (
+                    (
+                        item["category"],
+                        item["index"],
+                        item.get("text_JP", ""),
+                        item.get("text_TW", ""),
+                        item["text_CN"],
+                    )
+                    for item in iter_records(self.source_path)
+                ),
+            )
+            self.conn.executemany(
+                "INSERT INTO meta VALUES (?, ?)",
+                [
+                    ("version", str(SCHEMA_VERSION)),
+                    ("stat", json.dumps(source_signature(self.source_path))),
+                    ("sha256", source_hash(self.source_path)),
+                ],
+            )
+
+    def get_name(self, category: str, index: str, lang: str = "CN") -> str:
+        """传入 category 和 index，返回对应语言的名字"""
+        row = self.conn.execute(
+            f"SELECT {_column(lang)} FROM texts WHERE category = ? AND idx = ?",
+            (category, index),
+        ).fetchone()
+        return row[0] if row else f"[Missing] {category}_{index}"
+
+    def get_id(
+        self, category: str, name: str, inherit=False, lang: str = "CN"
+    ) -> str:
+        """传入 category 和名字，返回 index；同名时和 GameDatabase 一样取最后一条非继承记录"""
+        ids = self.get_ids(category, [name], lang).get(name)
+        if not ids:
+            return f"[Missing] {category}_{name}"
+        idx = ids[0]
+        if inherit:
+            idx = "9" + idx[1:]
+        return idx
+
+    def get_names(
+        self, category: str, indices: list[str], lang: str = "CN"
+    ) -> dict[str, str]:
+        """批量查询，一次 SQL 返回 {index: 名字}，查不到的 index 不在结果中"""
+        rows = self.conn.execute(
+            f"SELECT idx, {_column(lang)} FROM texts "
+            "WHERE category = ? AND idx IN (SELECT value FROM json_each(?))",
+            (category, json.dumps(list(indices))),
+        )
+        return dict(rows)
+
+    def get_ids(
+        self, category: str, names: list[str], lang: str = "CN"
+    ) -> dict[str, list[str]]:
+        """批量反查，一次 SQL 返回 {名字: [index, ...]}，按 index 从大到小，9xxxxx 继承技能排在最后"""
+        column = _column(lang)
+        rows = self.conn.execute(
+            f"SELECT {column}, idx FROM texts "
+            f"WHERE category = ? AND {column} IN (SELECT value FROM json_each(?)) "
+            "ORDER BY substr(idx, 1, 1) = '9', CAST(idx AS INTEGER) DESC",
+            (category, json.dumps(list(names), ensure_ascii=False)),
+        )
+        result = {}
+        for name, idx in rows:
+            result.setdefault(name, []).append(idx)
+        return result
+
+    def find(self, category: str, name: str) -> list[tuple[str, str]]:
+        """在三种语言中查找名字，返回 [(语言, index), ...]"""
+        result = []
+        for lang in LANGS:
+            for idx in self.get_ids(category, [name], lang).get(name, []):
+                result.append((lang, idx))
+        return result
+
+    def close(self):
+        self.conn.close()
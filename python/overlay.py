@@ -0,0 +1,251 @@
+"""分层的技能数据：上游日服数据为底层，上面依次叠加国服修正和手工补丁
+
+    jp     uma-skill-tools 的 skill_data.json，只读
+    cn     用 rets.json 修正后的条目（merge.merge_skill），只保存和 jp 不同的技能
+    patch  custom_patch.json 的整条覆盖
+
+每一层只保存自己改过的技能，读取时从最上层往下找，找到的对象直接返回、不复制，所以
+jp、cn、cn+patch 等多个版本共用没有修改过的条目。需要修改时用 Variant.edit 先复制到
+这个版本自己的一层（写时复制），不会影响其它版本。
+
+provenance 查询某个字段最后是哪一层设置的：
+
+    store = OverlayStore.from_sources(upstream, rets, custom_patch)
+    store.variant("jp", "cn", "patch").provenance("100231", "alternatives.0.effects.0.modifier")
+"""
+
+import argparse
+import copy
+import json
+from collections.abc import Mapping
+
+import artifacts
+import merge
+
+# 表示这一层删除了某个技能
+DELETED = object()
+
+_MISSING = object()
+
+
+def parse_path(path) -> tuple:
+    """"alternatives.0.effects.0.modifier" -> ("alternatives", 0, "effects", 0, "modifier")"""
+    if isinstance(path, (tuple, list)):
+        return tuple(path)
+    return tuple(int(part) if part.isdigit() else part for part in path.split("."))
+
+
+def lookup(value, path: tuple):
+    """按路径取值，路径不存在时返回 _MISSING"""
+    for part in path:
+        try:
+            value = value[part]
+        except (KeyError, IndexError, TypeError):
+            return _MISSING
+    return value
+
+
+class Layer:
+    """一层修改：{技能 id: 完整条目或 DELETED}，changes 为生成这一层时的修改记录"""
+
+    def __init__(self, name: str, entries: dict | None = None, changes=None):
+        self.name = name
+        self.entries = entries if entries is not None else {}
+        self.changes = changes if changes is not None else []
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def set(self, key, entry):
+        self.entries[key] = entry
+
+    def delete(self, key):
+        self.entries[key] = DELETED
+
+
+class Variant(Mapping):
+    """若干层叠加后的只读视图，按需逐个技能解析
+
+    返回的条目和各层共用，不要直接修改；需要修改时用 edit。
+    """
+
+    def __init__(self, layers: list[Layer], own: Layer | None = None):
+        self.layers = list(layers)
+        self._own = own  # edit 写入的私有层，没有时在第一次 edit 时创建
+        if own is not None:
+            self.layers.append(own)
+
+    def _find(self, key):
+        for layer in reversed(self.layers):
+            entry = layer.entries.get(key, _MISSING)
+            if entry is not _MISSING:
+                return layer, entry
+        return None, _MISSING
+
+    def __getitem__(self, key):
+        _, entry = self._find(key)
+        if entry is _MISSING or entry is DELETED:
+            raise KeyError(key)
+        return entry
+
+    def __contains__(self, key):
+        _, entry = self._find(key)
+        return entry is not _MISSING and entry is not DELETED
+
+    def __iter__(self):
+        # 和 merge.merge_keys 一致：底层的顺序在前，上层新增的技能按层依次追加
+        seen = set()
+        for layer in self.layers:
+            for key in layer.entries:
+                if key not in seen:
+                    seen.add(key)
+                    if key in self:
+                        yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def layer_of(self, key) -> str | None:
+        """提供这个技能当前条目的层"""
+        layer, entry = self._find(key)
+        return layer.name if layer is not None and entry is not DELETED else None
+
+    def fork(self, name: str = "what-if") -> "Variant":
+        """在这个版本上再叠一层空的私有层，之后的 edit 写入这一层，原版本不受影响
+
+        原版本的私有层从此冻结、由两边共用，原版本之后的 edit 写入新的私有层，新版本看不到。
+        """
+        child = Variant(self.layers, own=Layer(name))
+        self._own = None
+        return child
+
+    def edit(self, key) -> dict:
+        """写时复制：返回这个版本私有的可修改条目"""
+        if self._own is None:
+            self._own = Layer("edit")
+            self.layers.append(self._own)
+        if key not in self._own:
+            self._own.set(key, copy.deepcopy(self[key]))
+        return self._own.entries[key]
+
+    def provenance(self, key, path="") -> list[tuple[str, object]]:
+        """从下往上列出改变过这个字段的层和它设置的值，最后一项就是当前值的来源
+
+        path 为空时比较整个条目。某一层删除了这个字段（或整个技能）时值为 None。
+        """
+        path = parse_path(path) if path else ()
+        history = []
+        current = _MISSING
+        for layer in self.layers:
+            entry = layer.entries.get(key, _MISSING)
+            if entry is _MISSING:
+                continue
+            value = _MISSING if entry is DELETED else lookup(entry, path)
+            if value != current:
+                history.append((layer.name, None if value is _MISSING else value))
+                current = value
+        return history
+
+    def source(self, key, path="") -> str | None:
+        """当前值由哪一层设置"""
+        history = self.provenance(key, path)
+        return history[-1][0] if history else None
+
+    def materialize(self) -> dict:
+        """生成普通的 dict，条目对象和各层共用，只复制了最外层"""
+        return {key: self[key] for key in self}
+
+
+class OverlayStore:
+    """按名称管理各层，组合出不同的版本"""
+
+    def __init__(self, base: dict, base_name: str = "jp"):
+        self.layers = {base_name: Layer(base_name, base)}
+
+    def add(self, layer: Layer) -> Layer:
+        self.layers[layer.name] = layer
+        return layer
+
+    def variant(self, *names) -> Variant:
+        """按给定顺序（从下往上）叠加各层，默认为全部层"""
+        names = names or tuple(self.layers)
+        return Variant([self.layers[name] for name in names])
+
+    @classmethod
+    def from_sources(cls, upstream: dict, rets: dict, custom_patch: dict, name_of=lambda key: key):
+        store = cls(upstream)
+        store.add(scraped_layer(upstream, rets, name_of))
+        store.add(patch_layer(custom_patch, name_of))
+        return store
+
+
+def scraped_layer(upstream: dict, rets: dict, name_of=lambda key: key, name="cn") -> Layer:
+    """用国服数据修正上游条目，只保存和上游不同的技能"""
+    layer = Layer(name)
+    for key, other_skill in upstream.items():
+        rets_skill = rets.get(key)
+        if rets_skill is None:
+            continue
+        entry, changes, failed = merge.merge_skill(key, name_of(key), rets_skill, other_skill)
+        layer.changes.extend(changes)
+        if entry != other_skill:
+            layer.set(key, entry)
+    return layer
+
+
+def patch_layer(custom_patch: dict, name_of=lambda key: key, name="patch") -> Layer:
+    """custom_patch 的整条覆盖，和 MergeEngine 一样检查条件"""
+    layer = Layer(name)
+    for key, value in custom_patch.items():
+        entry = merge.apply_custom_patch(value)
+        layer.changes.append({"key": key, "name": name_of(key), "kind": "custom_patch"})
+
+        def record(kind, **fields):
+            layer.changes.append({"key": key, "name": name_of(key), "kind": kind, **fields})
+
+        for i, alt in enumerate(entry["alternatives"]):
+            merge.check_condition(alt.get("condition"), record, alt=i)
+        layer.set(key, entry)
+    return layer
+
+
+def _load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="分层合并技能数据，查询字段来源或输出多个版本")
+    parser.add_argument("--rets", default="rets.json")
+    parser.add_argument("--upstream", default="uma-skill-tools/data/skill_data.json")
+    parser.add_argument("--patch", default="custom_patch.json")
+    parser.add_argument(
+        "--variant",
+        action="append",
+        default=[],
+        metavar="NAME=LAYERS",
+        help="输出一个版本，例如 cn=jp,cn,patch；写入 --output-dir/skill_data.NAME.json",
+    )
+    parser.add_argument("--output-dir", default="umalator-cn")
+    parser.add_argument(
+        "--why", nargs=2, action="append", default=[], metavar=("KEY", "PATH"), help="查询字段来源"
+    )
+    args = parser.parse_args()
+
+    store = OverlayStore.from_sources(_load(args.upstream), _load(args.rets), _load(args.patch))
+    for name, layer in store.layers.items():
+        print(f"{name}: {len(layer)} 个技能")
+
+    full = store.variant()
+    for key, path in args.why:
+        print(f"{key} {path}:")
+        for layer, value in full.provenance(key, path):
+            print(f"  {layer}: {json.dumps(value, ensure_ascii=False)}")
+
+    for spec in args.variant:
+        name, _, layers = spec.partition("=")
+        variant = store.variant(*layers.split(",")) if layers else full
+        artifacts.emit(variant.materialize(), f"{args.output_dir}/skill_data.{name}.json")
@@ -0,0 +1,158 @@
+"""继承技（9xxxxx）相对于对应固有技（1xxxxx）的差分存储
+
+继承技和固有技的条件、效果类型基本相同，通常只有稀有度、持续时间和效果数值不同。
+差分格式中继承技写成
+
+    {"$base": "100061", "rarity": 1, "alternatives": {"0": {"baseDuration": 30000, ...}}}
+
+规则（decode 时按基准值的类型区分）：
+    基准是 dict、差分是 dict     逐个键递归，"$delete" 列出要删除的键
+    基准是 list、差分是 dict     键为下标，逐项递归；长度变化时 "$length" 为新长度，
+                                 超出基准长度的项直接是新值
+    其它情况                     差分就是新值，直接替换
+
+只有差分比完整条目短、并且还原结果（包括键顺序）和原条目逐字节一致时才写成差分，
+否则保留完整条目。文件格式为 {"version": 1, "skills": {技能 id: 条目或差分}}，
+技能顺序和原数据相同。
+"""
+
+import argparse
+import copy
+import json
+
+import artifacts
+
+VERSION = 1
+BASE = "$base"
+DELETE = "$delete"
+LENGTH = "$length"
+
+
+def _encode(value) -> bytes:
+    # 不排序键，比较时连键顺序一起比较
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def base_id(skill_id: str) -> str | None:
+    """继承技对应的固有技 id，和 GameDatabase.get_id 一样只换掉第一位"""
+    if skill_id[:1] != "9" or len(skill_id) < 2:
+        return None
+    return "1" + skill_id[1:]
+
+
+def diff(base, target):
+    """target 相对于 base 的差分；两者相同时返回 None"""
+    if base == target and type(base) is type(target):
+        return None
+    if isinstance(base, dict) and isinstance(target, dict):
+        delta = {}
+        for key, value in target.items():
+            if key not in base:
+                delta[key] = value
+            else:
+                d = diff(base[key], value)
+                if d is not None:
+                    delta[key] = d
+        removed = [key for key in base if key not in target]
+        if removed:
+            delta[DELETE] = removed
+        return delta
+    if isinstance(base, list) and isinstance(target, list):
+        delta = {}
+        for i, value in enumerate(target):
+            if i >= len(base):
+                delta[str(i)] = value
+            elif (d := diff(base[i], value)) is not None:
+                delta[str(i)] = d
+        if len(target) != len(base):
+            delta[LENGTH] = len(target)
+        return delta
+    return copy.deepcopy(target)
+
+
+def apply(base, delta):
+    """diff 的逆操作，返回新对象，不修改 base"""
+    if isinstance(base, dict) and isinstance(delta, dict):
+        result = {}
+        removed = set(delta.get(DELETE, ()))
+        for key, value in base.items():
+            if key in removed:
+                continue
+            result[key] = apply(value, delta[key]) if key in delta else copy.deepcopy(value)
+        for key, value in delta.items():
+            if key not in base and key != DELETE:
+                result[key] = copy.deepcopy(value)
+        return result
+    if isinstance(base, list) and isinstance(delta, dict):
+        result = []
+        for i in range(delta.get(LENGTH, len(base))):
+            if i >= len(base):
+                result.append(copy.deepcopy(delta[str(i)]))
+            elif str(i) in delta:
+                result.append(apply(base[i], delta[str(i)]))
+            else:
+                result.append(copy.deepcopy(base[i]))
+        return result
+    return copy.deepcopy(delta)
+
+
+def encode(skills: dict) -> dict:
+    """把继承技换成差分，返回 {"version", "skills"}"""
+    result = {}
+    for skill_id, entry in skills.items():
+        base = base_id(skill_id)
+        if base is None or base not in skills:
+            result[skill_id] = entry
+            continue
+        if BASE in entry:
+            result[skill_id] = entry
+            continue
+        delta = {BASE: base, **(diff(skills[base], entry) or {})}
+        full = _encode(entry)
+        if len(_encode(delta)) < len(full) and _encode(expand_entry(skills[base], delta)) == full:
+            result[skill_id] = delta
+        else:
+            result[skill_id] = entry
+    return {"version": VERSION, "skills": result}
+
+
+def expand_entry(base: dict, delta: dict) -> dict:
+    return apply(base, {k: v for k, v in delta.items() if k != BASE})
+
+
+def expand(data: dict) -> dict:
+    """encode 的逆操作，得到和原数据完全相同的技能数据"""
+    if data.get("version") != VERSION:
+        raise ValueError(f"不支持的差分格式版本：{data.get('version')}")
+    skills = data["skills"]
+    return {
+        skill_id: expand_entry(skills[entry[BASE]], entry) if BASE in entry else entry
+        for skill_id, entry in skills.items()
+    }
+
+
+def verify(skills: dict, data: dict):
+    """确认差分能还原出完全相同的数据（包括键顺序）"""
+    if _encode(expand(data)) != _encode(skills):
+        raise ValueError("差分数据无法还原原始技能数据")
+
+
+def write(skills: dict, path: str) -> dict:
+    data = encode(skills)
+    verify(skills, data)
+    artifacts.emit(data, path)
+    return data
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把继承技写成相对固有技的差分")
+    parser.add_argument("input", nargs="?", default="umalator-cn/skill_data.json")
+    parser.add_argument("--output", default="umalator-cn/skill_data.delta.json")
+    args = parser.parse_args()
+
+    with open(args.input, "r", encoding="utf-8") as f:
+        skills = json.load(f)
+    data = write(skills, args.output)
+    deltas = sum(1 for entry in data["skills"].values() if BASE in entry)
+    inherited = sum(1 for skill_id in skills if base_id(skill_id) in skills)
+    print(f"{deltas} / {inherited} 个继承技写成差分")
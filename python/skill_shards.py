@@ -0,0 +1,168 @@
+"""把合并后的 skill_data 拆成多个分片，前端可以只下载用到的技能
+
+分片目录中：
+    index.json   {"version": 1, "shards": [文件名, ...], "skills": {技能 id: [分片号, 偏移, 长度]}}
+    000.json ... 每个分片是一个 JSON 对象，键为技能 id
+
+偏移和长度是技能数据（不含键）在分片文件中的字节范围，前端可以直接切片解析单个技能。
+index.json 中 skills 的顺序就是原始 skill_data 的顺序，加载时按这个顺序还原，
+各技能内部的键顺序也原样保留，所以还原结果和拆分前逐字节一致。
+"""
+
+import argparse
+import functools
+import json
+import os
+
+import artifacts
+
+VERSION = 1
+INDEX = "index.json"
+SHARD_BYTES = 64 * 1024
+RANGE_SIZE = 200
+
+
+def _encode(value) -> bytes:
+    # 不排序键，保证能还原原来的顺序
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _base_id(skill_id: str) -> str:
+    # 形如 100701-1 的变体和原技能归在一起
+    return skill_id.split("-")[0]
+
+
+def group_key(skill_id: str, meta: dict):
+    """同一个 groupId 的技能（不同稀有度的同系技能）放在一起，没有元数据的按自身 id"""
+    base = _base_id(skill_id)
+    return meta.get(base, {}).get("groupId", base)
+
+
+def plan_ranges(skills: dict, per_shard=RANGE_SIZE) -> list[list[str]]:
+    """按 id 数值排序后每 per_shard 个技能一个分片，每个分片覆盖一段连续的 id
+
+    id 的位数差别很大（5 到 9 位），按固定区间切分会得到大量很小的分片，所以按数量切分。
+    """
+    ids = sorted(skills, key=lambda skill_id: (int(_base_id(skill_id)), skill_id))
+    return [ids[i : i + per_shard] for i in range(0, len(ids), per_shard)]
+
+
+def plan(skills: dict, key, shard_bytes=SHARD_BYTES) -> list[list[str]]:
+    """按 key 分组，再把相邻的组装进不超过 shard_bytes 的分片（单个组不会被拆开）"""
+    groups = {}
+    for skill_id in skills:
+        groups.setdefault(key(skill_id), []).append(skill_id)
+
+    shards, current, size = [], [], 0
+    for ids in groups.values():
+        group_size = sum(len(_encode(skills[i])) + len(i) + 4 for i in ids)
+        if current and size + group_size > shard_bytes:
+            shards.append(current)
+            current, size = [], 0
+        current.extend(ids)
+        size += group_size
+    if current:
+        shards.append(current)
+    return shards
+
+
+def build(skills: dict, shards: list[list[str]]):
+    """返回 (索引, {文件名: 内容})"""
+    index = {"version": VERSION, "shards": [], "skills": {}}
+    files = {}
+    locations = {}
+    for n, ids in enumerate(shards):
+        name = f"{n:03d}.json"
+        body = bytearray(b"{")
+        for i, skill_id in enumerate(ids):
+            if i:
+                body += b","
+            body += _encode(skill_id) + b":"
+            value = _encode(skills[skill_id])
+            locations[skill_id] = [n, len(body), len(value)]
+            body += value
+        body += b"}"
+        index["shards"].append(name)
+        files[name] = bytes(body)
+    index["skills"] = {skill_id: locations[skill_id] for skill_id in skills}
+    return index, files
+
+
+def write(skills: dict, directory: str, shards: list[list[str]], precompress=True) -> dict:
+    os.makedirs(directory, exist_ok=True)
+    index, files = build(skills, shards)
+    for name in os.listdir(directory):
+        # 清理上次多出来的分片
+        base = name.split(".")[0]
+        if base.isdigit() and f"{base}.json" not in files:
+            os.remove(os.path.join(directory, name))
+    for name, body in files.items():
+        path = os.path.join(directory, name)
+        artifacts.write_bytes(path, body)
+        if precompress:
+            for ext, blob in artifacts.compress(body).items():
+                artifacts.write_bytes(f"{path}.{ext}", blob)
+    artifacts.write_bytes(os.path.join(directory, INDEX), _encode(index))
+    return index
+
+
+def load(directory: str, ids=None) -> dict:
+    """按索引还原技能数据；ids 不为空时只读取这些技能所在的分片"""
+    with open(os.path.join(directory, INDEX), "r", encoding="utf-8") as f:
+        index = json.load(f)
+    if index.get("version") != VERSION:
+        raise ValueError(f"{directory} 的分片索引版本不是 {VERSION}")
+
+    wanted = index["skills"] if ids is None else {i: index["skills"][i] for i in ids}
+    contents = {}
+    result = {}
+    for skill_id, (shard, offset, length) in wanted.items():
+        if shard not in contents:
+            with open(os.path.join(directory, index["shards"][shard]), "rb") as f:
+                contents[shard] = f.read()
+        result[skill_id] = json.loads(contents[shard][offset : offset + length])
+    return result
+
+
+def verify(skills: dict, directory: str):
+    """确认分片能还原出完全相同的数据（包括键顺序）"""
+    if _encode(load(directory)) != _encode(skills):
+        raise ValueError(f"{directory} 中的分片无法还原原始数据")
+
+
+def shard(skills: dict, directory: str, by="group", meta=None, shard_bytes=SHARD_BYTES,
+          per_shard=RANGE_SIZE) -> dict:
+    """by="group" 按 groupId 分组后装箱；by="range" 按 id 区间切分"""
+    if by == "group":
+        shards = plan(skills, functools.partial(group_key, meta=meta or {}), shard_bytes)
+    elif by == "range":
+        shards = plan_ranges(skills, per_shard)
+    else:
+        raise ValueError(f"未知的分片方式：{by}")
+    index = write(skills, directory, shards)
+    verify(skills, directory)
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把 skill_data.json 拆成分片")
+    parser.add_argument("input", nargs="?", default="umalator-cn/skill_data.json")
+    parser.add_argument("--output", default="umalator-cn/skill_data")
+    parser.add_argument("--by", choices=["group", "range"], default="group")
+    parser.add_argument("--meta", default="umalator-cn/skill_meta.json")
+    parser.add_argument(
+        "--shard-bytes", type=int, default=SHARD_BYTES, help="按 group 分片时的目标大小"
+    )
+    parser.add_argument(
+        "--per-shard", type=int, default=RANGE_SIZE, help="按 range 分片时每片的技能数"
+    )
+    args = parser.parse_args()
+
+    with open(args.input, "r", encoding="utf-8") as f:
+        skills = json.load(f)
+    meta = None
+    if args.by == "group":
+        with open(args.meta, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    index = shard(skills, args.output, args.by, meta, args.shard_bytes, args.per_shard)
+    print(f"{len(index['skills'])} 个技能拆分为 {len(index['shards'])} 个分片，写入 {args.output}")
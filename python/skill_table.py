@@ -0,0 +1,161 @@
+"""按列存储的技能效果表，用于对 skill_data 做统计和查询
+
+skills -> alternatives -> effects 展开成每个效果一行，各列是 NumPy 数组：
+    skill          技能在 skill_ids 中的下标
+    alt            alternative 的序号
+    rarity         技能稀有度，没有时为 -1
+    base_duration  baseDuration
+    condition      条件在 conditions 中的编号，同一个 ConditionTable 加载的多个文件编号一致
+    type / modifier / target   效果的字段，没有 target 时为 -1
+没有效果的 alternative 不产生行。
+
+rets.json、other_merged.json 和合并输出的格式相同，都可以用 SkillTable.load 读取；
+多个文件共用一个 ConditionTable 时可以直接比较 condition 列。
+"""
+
+import functools
+import json
+import operator
+
+import numpy as np
+
+import conditions
+
+COLUMNS = {
+    "skill": np.int32,
+    "alt": np.int8,
+    "rarity": np.int8,
+    "base_duration": np.int32,
+    "condition": np.int32,
+    "type": np.int16,
+    "modifier": np.int32,
+    "target": np.int16,
+}
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _branches(text: str) -> tuple[frozenset, ...]:
+    return tuple(frozenset(branch) for branch in conditions.parse(text, strict=False))
+
+
+class SkillTable:
+    def __init__(self, columns: dict, skill_ids, table: conditions.ConditionTable):
+        self.columns = columns
+        self.skill_ids = skill_ids
+        self.conditions = table
+
+    @classmethod
+    def from_skills(cls, skills: dict, table: conditions.ConditionTable | None = None):
+        table = table if table is not None else conditions.ConditionTable()
+        skill_ids = np.array(list(skills), dtype=object)
+        rows = {name: [] for name in COLUMNS}
+        for n, skill in enumerate(skills.values()):
+            rarity = skill.get("rarity", -1)
+            for i, alt in enumerate(skill["alternatives"]):
+                condition = table.intern(alt.get("condition") or "")
+                for effect in alt.get("effects", []):
+                    rows["skill"].append(n)
+                    rows["alt"].append(i)
+                    rows["rarity"].append(rarity)
+                    rows["base_duration"].append(alt.get("baseDuration", 0))
+                    rows["condition"].append(condition)
+                    rows["type"].append(effect.get("type", -1))
+                    rows["modifier"].append(effect.get("modifier", 0))
+                    rows["target"].append(effect.get("target", -1))
+        columns = {name: np.array(rows[name], dtype=dtype) for name, dtype in COLUMNS.items()}
+        return cls(columns, skill_ids, table)
+
+    @classmethod
+    def load(cls, path: str, table: conditions.ConditionTable | None = None):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_skills(json.load(f), table)
+
+    def __len__(self):
+        return len(self.columns["skill"])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def where(self, mask) -> "SkillTable":
+        return SkillTable(
+            {name: column[mask] for name, column in self.columns.items()},
+            self.skill_ids,
+            self.conditions,
+        )
+
+    def filter(self, **criteria) -> "SkillTable":
+        """按列筛选，值可以是常数、(运算符, 常数) 或集合
+
+        table.filter(type=27, modifier=(">", 3500), target={1, 9})
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for name, value in criteria.items():
+            column = self.columns[name]
+            if isinstance(value, tuple):
+                op, value = value
+                mask &= OPERATORS[op](column, value)
+            elif isinstance(value, (set, frozenset, list)):
+                mask &= np.isin(column, list(value))
+            else:
+                mask &= column == value
+        return self.where(mask)
+
+    def condition_mask(self, text: str, every_branch=False) -> np.ndarray:
+        """条件中包含 text 的所有项的行，例如 "phase>=2"、"phase>=2&order<=3"
+
+        默认只要有一个分支包含即可；every_branch 时要求每个分支都包含。
+        """
+        wanted = set(conditions.parse(text, strict=False)[0])
+        check = all if every_branch else any
+        matched = [
+            i
+            for i, cond in enumerate(self.conditions.conditions)
+            if (branches := _branches(cond)) and check(wanted <= b for b in branches)
+        ]
+        return np.isin(self.columns["condition"], matched)
+
+    def with_condition(self, text: str, every_branch=False) -> "SkillTable":
+        return self.where(self.condition_mask(text, every_branch))
+
+    def unique(self, name) -> list:
+        return np.unique(self.columns[name]).tolist()
+
+    def group_by(self, name) -> dict:
+        """按列的值分组，返回 {值: SkillTable}"""
+        column = self.columns[name]
+        order = np.argsort(column, kind="stable")
+        values, starts = np.unique(column[order], return_index=True)
+        bounds = list(starts[1:]) + [len(order)]
+        return {
+            value: self.where(order[start:end])
+            for value, start, end in zip(values.tolist(), starts, bounds)
+        }
+
+    def count_by(self, *names) -> dict:
+        """按一列或多列计数"""
+        keys = np.stack([self.columns[name] for name in names], axis=1)
+        values, counts = np.unique(keys, axis=0, return_counts=True)
+        return {
+            tuple(v) if len(names) > 1 else v[0]: c
+            for v, c in zip(values.tolist(), counts.tolist())
+        }
+
+    def skills(self) -> list[str]:
+        """包含的技能 id，按原顺序去重"""
+        return self.skill_ids[np.unique(self.columns["skill"])].tolist()
+
+    def rows(self):
+        for i in range(len(self)):
+            row = {name: column[i].item() for name, column in self.columns.items()}
+            row["skill"] = self.skill_ids[row["skill"]]
+            row["condition"] = self.conditions.conditions[row["condition"]]
+            yield row
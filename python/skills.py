@@ -1,12 +1,17 @@
-import requests
-from bs4 import BeautifulSoup
+import argparse
+import hashlib
 import json
+import os
+from urllib.parse import quote
+
 from lxml import html
 
+import html_extract
+import metrics
+from fetcher import DEFAULT_HEADERS, Fetcher
+from http_cache import HttpCache
 from umas import GameDatabase
 
-db = GameDatabase("python/name.lua", "name.json")
-
 
 def split_trigger_code(code):
     code = code.strip()
@@ -26,179 +31,340 @@ def split_trigger_code(code):
     return result
 
 
-def fetch_add_save_new(save_path="test.json"):
-    url = "https://wiki.biligame.com/umamusume/%E7%AE%80%E4%B8%AD%E6%8A%80%E8%83%BD%E9%80%9F%E6%9F%A5%E8%A1%A8"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36 Edg/138.0.0.0",
-        "Referer": "https://wiki.biligame.com/umamusume/%E7%AE%80/%E7%87%83%E7%83%A7%E9%9D%92%E6%98%A5%C2%B7%E9%80%9F",
-        "Accept-Language": "zh-CN,zh;q=0.9",
-    }
-    response = requests.get(url, headers=headers)
-    soup = BeautifulSoup(response.text, "html.parser")
-    json_div = soup.find("div", {"id": "jn-json"})
-    clean_json = json_div.text
-    start = clean_json.find("[")
-    end = clean_json.rfind("]") + 1
-    json_text = clean_json[start:end]
-    index = json_text.rfind(",")
-    if index != -1:
-        json_text = json_text[:index] + json_text[index + 1 :]
-    data = json.loads(json_text)
-    skills = set()
-    for d in data:
-        skills.add((d["1"], d["3"]))
-    # scrapy details
-    skill_effect_types = {
-        "被动（速度）": 1,
-        "被动（耐力）": 2,
-        "被动（力量）": 3,
-        "被动（毅力）": 4,
-        "被动（智力）": 5,
-        "视野": 8,
-        "心态": 13,
-        "妨害（视野）": 8,
-        "耐力恢复": 9,
-        "出闸": 10,
-        "妨害（耐力恢复）": 9,
-        "妨害（加速度）": 31,
-        "妨害（速度）": 21,
-        "即时速度": 22,
-        "速度": 27,
-        "横向速度": 28,
-        "加速度": 31,
-        "全属性增加": 32,
-        "触发金技": 37,
-        "切换跑道": 35,
-        "焦躁概率": 29,
-        "出迟时长": 14,
-        # "xxxx": 6, 大逃
-        # "xxx": 42, 创世驹
-    }
-
-    def split_field(value, inner_split=False):
-        """根据 @ 或 条件 切分，并去掉空格"""
-        if "条件" in value:
-            # 只保留从第一个 '条件' 开始的部分
-            start_index = value.find("条件")
-            value = value[start_index:]
-            parts = []
-            for line in value.splitlines():
-                if ":" in line:
-                    parts.append(line.split(":", 1)[1])
-        else:
-            parts = [value]
-        return [
-            p.replace(" ", "").split("、") if inner_split else p.replace(" ", "")
-            for p in parts
-            if p.strip()
-        ]
-
-    def prepare_fields(trigger_code, trigger_type, trigger_value, trigger_time):
-        conditions = split_field(trigger_code)
-        type_parts = (
-            split_field(trigger_type, True)
-            if "条件" in trigger_type or len(conditions) == 1
-            else [trigger_type] * len(conditions)
-        )
-        value_parts = (
-            split_field(trigger_value, True)
-            if "条件" in trigger_value or len(conditions) == 1
-            else [trigger_value] * len(conditions)
-        )
-        time_parts = (
-            split_field(trigger_time)
-            if "条件" in trigger_time or len(conditions) == 1
-            else [trigger_time] * len(conditions)
-        )
-        return conditions, type_parts, value_parts, time_parts
+WIKI_BASE = "https://wiki.biligame.com/umamusume/"
+LISTING_PAGE = "%E7%AE%80%E4%B8%AD%E6%8A%80%E8%83%BD%E9%80%9F%E6%9F%A5%E8%A1%A8"
+HEADERS = {
+    **DEFAULT_HEADERS,
+    "Referer": "https://wiki.biligame.com/umamusume/%E7%AE%80/%E7%87%83%E7%83%A7%E9%9D%92%E6%98%A5%C2%B7%E9%80%9F",
+}
 
-    def build_skill_json(trigger_code, trigger_type, trigger_value, trigger_time):
-        conditions, type_parts, value_parts, time_parts = prepare_fields(
-            trigger_code, trigger_type, trigger_value, trigger_time
-        )
-        alternatives = []
-        for cond, t, v, tm in zip(conditions, type_parts, value_parts, time_parts):
-            effects = []
-            for type_, eval_ in zip(t, v):
-                if type_ not in skill_effect_types.keys():
-                    return None  # 有类型不对，直接跳过
-                effects.append(
-                    {
-                        "modifier": int(float(eval_) * 10000),
-                        "type": skill_effect_types[type_],
-                    }
-                )
-            if tm == "始终":
-                baseDuration = -1
-            elif tm == "瞬时":
-                baseDuration = 0
-            else:
-                baseDuration = int(float(tm) * 10000)
-            alternatives.append(
+SKILL_EFFECT_TYPES = {
+    "被动（速度）": 1,
+    "被动（耐力）": 2,
+    "被动（力量）": 3,
+    "被动（毅力）": 4,
+    "被动（智力）": 5,
+    "视野": 8,
+    "心态": 13,
+    "妨害（视野）": 8,
+    "耐力恢复": 9,
+    "出闸": 10,
+    "妨害（耐力恢复）": 9,
+    "妨害（加速度）": 31,
+    "妨害（速度）": 21,
+    "即时速度": 22,
+    "速度": 27,
+    "横向速度": 28,
+    "加速度": 31,
+    "全属性增加": 32,
+    "触发金技": 37,
+    "切换跑道": 35,
+    "焦躁概率": 29,
+    "出迟时长": 14,
+    # "xxxx": 6, 大逃
+    # "xxx": 42, 创世驹
+}
+
+
+def split_field(value, inner_split=False):
+    """根据 @ 或 条件 切分，并去掉空格"""
+    if "条件" in value:
+        # 只保留从第一个 '条件' 开始的部分
+        start_index = value.find("条件")
+        value = value[start_index:]
+        parts = []
+        for line in value.splitlines():
+            if ":" in line:
+                parts.append(line.split(":", 1)[1])
+    else:
+        parts = [value]
+    return [
+        p.replace(" ", "").split("、") if inner_split else p.replace(" ", "")
+        for p in parts
+        if p.strip()
+    ]
+
+
+def prepare_fields(trigger_code, trigger_type, trigger_value, trigger_time):
+    conditions = split_field(trigger_code)
+    type_parts = (
+        split_field(trigger_type, True)
+        if "条件" in trigger_type or len(conditions) == 1
+        else [trigger_type] * len(conditions)
+    )
+    value_parts = (
+        split_field(trigger_value, True)
+        if "条件" in trigger_value or len(conditions) == 1
+        else [trigger_value] * len(conditions)
+    )
+    time_parts = (
+        split_field(trigger_time)
+        if "条件" in trigger_time or len(conditions) == 1
+        else [trigger_time] * len(conditions)
+    )
+    return conditions, type_parts, value_parts, time_parts
+
+
+def build_skill_json(trigger_code, trigger_type, trigger_value, trigger_time):
+    conditions, type_parts, value_parts, time_parts = prepare_fields(
+        trigger_code, trigger_type, trigger_value, trigger_time
+    )
+    alternatives = []
+    for cond, t, v, tm in zip(conditions, type_parts, value_parts, time_parts):
+        effects = []
+        for type_, eval_ in zip(t, v):
+            if type_ not in SKILL_EFFECT_TYPES.keys():
+                return None  # 有类型不对，直接跳过
+            effects.append(
                 {
-                    "baseDuration": baseDuration,
-                    "condition": cond,
-                    "effects": effects,
+                    "modifier": int(float(eval_) * 10000),
+                    "type": SKILL_EFFECT_TYPES[type_],
                 }
             )
-        return {"alternatives": alternatives}
+        if tm == "始终":
+            baseDuration = -1
+        elif tm == "瞬时":
+            baseDuration = 0
+        else:
+            baseDuration = int(float(tm) * 10000)
+        alternatives.append(
+            {
+                "baseDuration": baseDuration,
+                "condition": cond,
+                "effects": effects,
+            }
+        )
+    return {"alternatives": alternatives}
 
-    rets = {}
-    for full, name in skills:
+
+def parse_listing(content):
+    """从速查表页面的 div#jn-json 中取出技能列表"""
+    text = html_extract.find_text(content, "div", {"id": "jn-json"})
+    return html_extract.load_array(text, "速查表 div#jn-json")
+
+
+def _get_text(cell_list):
+    if not cell_list:
+        return None
+    parts = cell_list[0].xpath("./node()")
+    texts = []
+    for part in parts:
+        if isinstance(part, str):
+            texts.append(part.strip())
+        elif part.tag == "br":
+            texts.append("\n")  # <br> 转换成换行
+        else:
+            texts.append(part.xpath("string(.)").strip())
+    return "".join(texts)
+
+
+def parse_skill_page(content):
+    """解析技能详情页，返回 (触发代码, 技能类型, 技能数值, 持续时间)"""
+    tree = html.fromstring(content)
+    trigger_code = trigger_type = trigger_value = trigger_time = None
+    # 暂时国服没有前置，所有只用以前的版本
+    skill_tables = tree.xpath('//*[@id="mw-content-text"]/div/div/div[1]/table')
+    for table in skill_tables:
+        rows = table.xpath("tbody/tr")
+        trigger_code = trigger_type = trigger_value = trigger_time = None
+        for tr in rows:
+            # 获取第一列的字段名，第二列的值
+            key = _get_text(tr.xpath("th | td[1]"))
+            val = _get_text(tr.xpath("td[last()]"))
+
+            if key in ["触发代码", "trigger_code"]:
+                trigger_code = val
+            elif key in ["技能类型", "trigger_type"]:
+                trigger_type = val
+            elif key in ["技能数值", "trigger_value"]:
+                trigger_value = val
+            elif key in ["持续时间", "trigger_time"]:
+                trigger_time = val
+    return trigger_code, trigger_type, trigger_value, trigger_time
+
+
+def _digest(value):
+    text = json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def load_manifest(path):
+    """读取增量清单：full -> {row: 列表行哈希, page: 详情页字段哈希, id: 技能 id}"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def fetch_add_save_new(
+    save_path="rets.json",
+    base_url=WIKI_BASE,
+    concurrency=8,
+    rate=5.0,
+    retries=3,
+    cache=None,
+    incremental=False,
+    manifest_path="rets_manifest.json",
+):
+    """抓取国服技能数据写入 save_path
+
+    incremental 为 True 时只抓取速查表中新增或变化的技能，并合并进已有的 save_path；
+    两种模式都会更新 manifest_path 供下次增量使用
+    """
+    with Fetcher(
+        headers=HEADERS,
+        concurrency=concurrency,
+        rate=rate,
+        retries=retries,
+        cache=cache,
+    ) as fetcher:
+        with metrics.span("listing.fetch"):
+            listing = fetcher.get(base_url + LISTING_PAGE)
+        with metrics.span("listing.parse"):
+            data = parse_listing(listing)
+        rows = {}
+        for d in data:
+            rows.setdefault((d["1"], d["3"]), []).append(d)
+        # 排序保证每次输出到 rets.json 的顺序一致
+        skills = sorted(rows)
+        row_hashes = {full: _digest(rows[(full, name)]) for full, name in skills}
+
+        old_manifest = load_manifest(manifest_path) if incremental else {}
+        old_rets = {}
+        if incremental and os.path.exists(save_path):
+            with open(save_path, "r", encoding="utf-8") as f:
+                old_rets = json.load(f)
+
+        def unchanged(full):
+            entry = old_manifest.get(full)
+            return (
+                entry is not None
+                and entry["row"] == row_hashes[full]
+                and (entry["id"] is None or entry["id"] in old_rets)
+            )
+
+        targets = [(full, name) for full, name in skills if not unchanged(full)]
+        # scrapy details
         # full = "简/赐福船歌"
-        url = f"https://wiki.biligame.com/umamusume/{full}"
-        response = requests.get(url, headers=headers)
-        tree = html.fromstring(response.content)
-        # 暂时国服没有前置，所有只用以前的版本
-        skill_tables = tree.xpath('//*[@id="mw-content-text"]/div/div/div[1]/table')
-        for table in skill_tables:
-            rows = table.xpath("tbody/tr")
-            trigger_code = trigger_type = trigger_value = trigger_time = None
-            for tr in rows:
-                # 获取第一列的字段名，第二列的值
-                key_td = tr.xpath("th | td[1]")
-                val_td = tr.xpath("td[last()]")
-
-                def get_text(cell_list):
-                    if not cell_list:
-                        return None
-                    parts = cell_list[0].xpath("./node()")
-                    texts = []
-                    for part in parts:
-                        if isinstance(part, str):
-                            texts.append(part.strip())
-                        elif part.tag == "br":
-                            texts.append("\n")  # <br> 转换成换行
-                        else:
-                            texts.append(part.xpath("string(.)").strip())
-                    return "".join(texts)
-
-                key = get_text(key_td)
-                val = get_text(val_td)
-
-                if key in ["触发代码", "trigger_code"]:
-                    trigger_code = val
-                elif key in ["技能类型", "trigger_type"]:
-                    trigger_type = val
-                elif key in ["技能数值", "trigger_value"]:
-                    trigger_value = val
-                elif key in ["持续时间", "trigger_time"]:
-                    trigger_time = val
+        with metrics.span("pages.fetch", pages=len(targets)):
+            pages = fetcher.get_many([base_url + quote(full) for full, _ in targets])
+        metrics.count("skills.unchanged", len(skills) - len(targets))
+        print(
+            f"速查表共 {len(skills)} 个技能，下载 {len(pages)} 个技能页面，"
+            f"{fetcher.throughput():.1f} 页/秒，共 {fetcher.bytes} 字节"
+        )
+        if cache:
+            print(f"缓存命中 {cache.hits}，重新验证 {cache.revalidated}")
+
+    # 在 metrics.run 之内加载，计入这次运行的耗时
+    with metrics.span("name_table"):
+        db = GameDatabase("python/name.lua", "name.json")
+    manifest = {}
+    results = {}  # full -> 技能数据
+
+    def reuse(full, name, old, row=None):
+        """沿用上次的结果；name.lua 可能已经更新，id 重新查找，之前 [Missing] 的技能也能找到"""
+        entry = {**old, "row": row or row_hashes[full]}
+        if old["id"] is not None:
+            results[full] = old_rets[old["id"]]
+            id, _ = db.find_id(category="47", name=name, inherit="继承技" in full)
+            if id != old["id"]:
+                print(f"[重新匹配] {name}：{old['id']} -> {id}")
+                metrics.count("skills.reresolved")
+                entry["id"] = id
+        manifest[full] = entry
+
+    for full, name in skills:
+        if unchanged(full):
+            reuse(full, name, old_manifest[full])
+    updated = 0
+    for (full, name), content in zip(targets, pages):
+        if isinstance(content, Exception):
+            print(f"下载失败：{full}，{content}，跳过")
+            metrics.count("skills.failed")
+            old = old_manifest.get(full)
+            if old is not None and (old["id"] is None or old["id"] in old_rets):
+                # 保留上次的结果，清单中仍是旧的列表行哈希，下次增量时会重新抓取
+                reuse(full, name, old, row=old["row"])
+            continue
+        with metrics.span("page.parse"):
+            fields = parse_skill_page(content)
+        page_hash = _digest(fields)
+        old = old_manifest.get(full)
+        if old is not None and old["page"] == page_hash and old["id"] in old_rets:
+            # 列表行变了但详情页内容没变，沿用已有结果
+            reuse(full, name, old)
+            metrics.count("skills.reused")
+            continue
+        manifest[full] = {"row": row_hashes[full], "page": page_hash, "id": None}
+        trigger_code, trigger_type, trigger_value, trigger_time = fields
         if not trigger_code:
             print(f"未找到目标单元格：{full}，跳过")
+            metrics.count("skills.skipped")
             continue
         result = build_skill_json(
             trigger_code, trigger_type, trigger_value, trigger_time
         )
         if result is None:
             print(f"未找到该技能的类型：{full}，跳过")
+            metrics.count("skills.skipped")
+            continue
+        id, candidate = db.find_id(category="47", name=name, inherit="继承技" in full)
+        if candidate is not None:
+            print(f"[规范化匹配] {name} -> {candidate.text}（{candidate.lang}）")
+            metrics.count("skills.fuzzy_matched")
+        elif id.startswith("[Missing]"):
+            # 只列出相近的名称，不自动采用，避免把国服数据写到别的技能上
+            candidates = db.resolver.search("47", name, limit=3)
+            if candidates:
+                hints = "、".join(f"{c.text}({c.index}, {c.score:.2f})" for c in candidates)
+                print(f"[未匹配] {name}，相近的名称：{hints}")
+            metrics.count("skills.unresolved")
+        manifest[full]["id"] = id
+        results[full] = result
+        updated += 1
+        metrics.count("skills.parsed")
+
+    rets = {}
+    for full, _ in skills:
+        entry = manifest.get(full)
+        if entry is None or entry["id"] is None:
             continue
-        id = db.get_id(category="47", name=name, inherit="继承技" in full)
-        rets[id] = result
+        rets[entry["id"]] = results[full]
+    if incremental:
+        listed = {full for full, _ in skills}
+        removed = [full for full, entry in old_manifest.items() if full not in listed and entry["id"]]
+        print(f"更新 {updated} 个技能，删除 {len(removed)} 个已不在速查表中的技能")
 
-    with open("rets.json", "w", encoding="utf-8") as f:
-        json.dump(rets, f, ensure_ascii=False, indent=4)
+    with metrics.span("write"):
+        with open(save_path, "w", encoding="utf-8") as f:
+            json.dump(rets, f, ensure_ascii=False, indent=4)
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
 
 
 if __name__ == "__main__":
-    fetch_add_save_new()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default=WIKI_BASE, help="wiki 地址，可指向本地的测试服务")
+    parser.add_argument("--concurrency", type=int, default=8, help="同时下载的页面数")
+    parser.add_argument("--rate", type=float, default=5.0, help="每秒最多请求数，0 为不限速")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--cache-dir", default=".http_cache", help="响应缓存目录，空字符串为不缓存")
+    parser.add_argument("--ttl", type=float, default=24 * 3600, help="缓存在多少秒内不重新验证")
+    parser.add_argument("--offline", action="store_true", help="只用缓存，不访问网络")
+    parser.add_argument("--incremental", action="store_true", help="只抓取速查表中新增或变化的技能")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    with metrics.run("skills", args.metrics, args.profile):
+        fetch_add_save_new(
+            base_url=args.base_url,
+            concurrency=args.concurrency,
+            rate=args.rate or None,
+            retries=args.retries,
+            cache=(
+                HttpCache(args.cache_dir, ttl=args.ttl, offline=args.offline)
+                if args.cache_dir
+                else None
+            ),
+            incremental=args.incremental,
+        )
@@ -1,62 +1,132 @@
+import argparse
 import json
 
-with open("course_data_normal.json", "r", encoding="utf-8") as f:
-    course_data = json.load(f)
-
-with open("course_data_slope.json", "r", encoding="utf-8") as f:
-    points_data = json.load(f)
-
-# 坡度阈值（判断方向）
-SLOPE_THRESHOLD = 0.1
-
-
-def generate_slopes(points, total_distance):
-    num_points = len(points)
-    course_length = total_distance
-    slopes = []
-
-    # 先生成每个米的位置对应的 slope 和 direction
-    slope_list = []
-    for pos in range(0, int(course_length) + 1):
-        t = 1000 * pos / course_length
-        i = int(t)
-        if i >= num_points - 1:
-            i = num_points - 2
-        slope_value = 100 * (points[i] + (points[i + 1] - points[i]) * (t - i))
-        direction = 1 if slope_value > 1 else -1 if slope_value < -1 else 0
-        slope_list.append((pos, slope_value, direction))
-
-    pos = 1
-    while pos < len(slope_list):
-        _, slope_value, direction = slope_list[pos]
-        if direction != 0 and direction != slope_list[pos - 1][2]:
-            end_pos = pos
-            totol_slope = slope_value
-            while end_pos < len(slope_list) and direction == slope_list[end_pos][2]:
-                totol_slope += slope_list[end_pos][1]
-                end_pos += 1
-            segment = {
-                "start": int(pos),
-                "length": int(end_pos - pos + 1),
-                "slope": totol_slope / (end_pos - pos + 1) * 10000,
-            }
-            slopes.append(segment)
-            pos = end_pos
-        pos += 1
-
-    return slopes
-
-
-# 遍历每个 course，填充 slopes
-for course_id, course in course_data.items():
-    points = points_data[str(course["raceTrackId"])]["courses"][course_id]["slopes"]
-    if not points:
-        continue
-    total_distance = course.get("distance", 1200)
-    course["slopes"] = generate_slopes(points, total_distance)
-
-# 保存新文件
-with open("umalator-cn/course_data.json", "w", encoding="utf-8") as f:
-    json.dump(course_data, f, ensure_ascii=False, indent=4)
-
-print("转换完成，生成 course_data_with_slopes.json")
+import numpy as np
+
+import artifacts
+import course_pack
+import metrics
+
+# 坡度阈值（判断方向），坡度（百分比）超过 ±SLOPE_THRESHOLD 才算上坡/下坡
+SLOPE_THRESHOLD = 1.0
+
+
+def generate_all_slopes(profiles, resolution=1, threshold=SLOPE_THRESHOLD):
+    """一次处理所有赛道
+
+    profiles 是 [(points, total_distance), ...]，返回每条赛道的 slopes 列表，顺序相同。
+    resolution 为采样间隔（米），threshold 为判断上下坡的坡度阈值。
+    """
+    if not profiles:
+        return []
+
+    # 把所有赛道按米展开成一个数组，course 记录每个采样点属于哪条赛道
+    offsets = np.cumsum([0] + [len(points) for points, _ in profiles[:-1]])
+    flat_points = np.concatenate(
+        [np.asarray(points, dtype=np.float64) for points, _ in profiles]
+    )
+    sample_pos, sample_course = [], []
+    for c, (points, total_distance) in enumerate(profiles):
+        pos = np.arange(0, int(total_distance) + 1, resolution, dtype=np.int64)
+        sample_pos.append(pos)
+        sample_course.append(np.full(len(pos), c))
+    pos = np.concatenate(sample_pos)
+    course = np.concatenate(sample_course)
+    length = np.array([d for _, d in profiles])[course]
+    num_points = np.array([len(p) for p, _ in profiles])[course]
+
+    # 线性插值，运算顺序和逐米计算时一致，保证结果逐位相同
+    t = 1000 * pos / length
+    i = np.minimum(t.astype(np.int64), num_points - 2)
+    p0 = flat_points[offsets[course] + i]
+    p1 = flat_points[offsets[course] + i + 1]
+    values = 100 * (p0 + (p1 - p0) * (t - i))
+    direction = np.where(values > threshold, 1, np.where(values < -threshold, -1, 0))
+
+    # 方向相同的连续采样点为一段；赛道的分界处也断开
+    course_start = np.r_[True, course[1:] != course[:-1]]
+    run_start = np.flatnonzero(course_start | np.r_[True, direction[1:] != direction[:-1]])
+    run_end = np.r_[run_start[1:], len(direction)]
+    run_dir = direction[run_start]
+
+    # 和逐点扫描一致：赛道第一段不输出；一段输出后，紧接着的下一段会被跳过，
+    # 所以连续的非平地段中只有第 1、3、5… 段被输出
+    eligible = (run_dir != 0) & ~course_start[run_start]
+    ids = np.arange(len(run_start))
+    chain_start = eligible & ~np.r_[False, eligible[:-1]]
+    chain_first = np.maximum.accumulate(np.where(chain_start, ids, 0))
+    emitted = eligible & ((ids - chain_first) % 2 == 0)
+
+    # 每段的平均坡度：起点的值会被计入两次，长度也多算一个点。
+    # 各段补零对齐后按行 cumsum，逐行顺序累加，和逐米累加的浮点结果逐位相同
+    seg_start = run_start[emitted]
+    seg_len = run_end[emitted] - seg_start
+    width = int(seg_len.max()) if len(seg_len) else 0
+    cols = np.arange(width)
+    idx = np.minimum(seg_start[:, None] + cols, len(values) - 1)
+    padded = np.where(cols < seg_len[:, None], values[idx], 0.0)
+    totals = np.cumsum(np.c_[values[seg_start], padded], axis=1)[:, -1]
+    n = seg_len + 1
+    means = totals / n * 10000
+
+    result = [[] for _ in profiles]
+    for c, start, length, mean in zip(
+        course[seg_start].tolist(),
+        pos[seg_start].tolist(),
+        (n * resolution).tolist(),
+        means.tolist(),
+    ):
+        result[c].append({"start": start, "length": length, "slope": mean})
+    return result
+
+
+def generate_slopes(points, total_distance, resolution=1, threshold=SLOPE_THRESHOLD):
+    return generate_all_slopes([(points, total_distance)], resolution, threshold)[0]
+
+
+def fill_course_slopes(course_data, points_data, resolution=1, threshold=SLOPE_THRESHOLD):
+    """遍历每个 course，填充 slopes；没有高度数据的赛道保持原样"""
+    ids, profiles = [], []
+    for course_id, course in course_data.items():
+        points = points_data[str(course["raceTrackId"])]["courses"][course_id]["slopes"]
+        if not points:
+            continue
+        ids.append(course_id)
+        profiles.append((points, course.get("distance", 1200)))
+    for course_id, slopes in zip(ids, generate_all_slopes(profiles, resolution, threshold)):
+        course_data[course_id]["slopes"] = slopes
+    return course_data
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", default="course_data_normal.json")
+    parser.add_argument("--points", default="course_data_slope.json", help="每条赛道的高度数据")
+    parser.add_argument("--output", default="umalator-cn/course_data.json")
+    parser.add_argument("--resolution", type=int, default=1, help="采样间隔（米）")
+    parser.add_argument("--threshold", type=float, default=SLOPE_THRESHOLD)
+    parser.add_argument(
+        "--pack", default="course_data.pack", help="逐米二进制数据包，只在本地使用、不部署，空字符串为不生成"
+    )
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+
+    with metrics.run("slope", args.metrics, args.profile):
+        with metrics.span("load"):
+            with open(args.input, "r", encoding="utf-8") as f:
+                course_data = json.load(f)
+            with open(args.points, "r", encoding="utf-8") as f:
+                points_data = json.load(f)
+
+        with metrics.span("slopes"):
+            fill_course_slopes(course_data, points_data, args.resolution, args.threshold)
+        metrics.count("courses", len(course_data))
+
+        # 保存新文件
+        with metrics.span("write"):
+            artifacts.emit(course_data, args.output)
+
+        if args.pack:
+            with metrics.span("pack"):
+                course_pack.write_pack(course_data, args.pack)
+        print(f"转换完成，生成 {args.output}")
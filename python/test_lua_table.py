@@ -0,0 +1,39 @@
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import lua_table  # noqa: E402
+
+SOURCE = """local names = {
+{id="4",category="4",index="1",text="a"},
+{id="4",category="4",index="2",text="b},
+{id="4",category="4",index="3",text="c"},
+{
+  id="4", category="4", index="4",
+  text="d
+},
+{id="4",category="4",index="5",text="e"},
+}
+local more = {{id="6",category="6",index="6",text="f"}}
+"""
+
+
+@pytest.mark.parametrize("chunk_size", [7, 1 << 16])
+def test_records_after_unterminated_string_are_kept(chunk_size):
+    errors = []
+    records = lua_table.iter_records(io.StringIO(SOURCE), errors.append, chunk_size=chunk_size)
+    assert [r["index"] for r in records] == ["1", "3", "5", "6"]
+    assert [(e.line, str(e).split("（")[0]) for e in errors] == [
+        (3, "字符串没有结束"),
+        (7, "字符串没有结束"),
+    ]
+
+
+def test_unterminated_string_raises_without_on_error():
+    with pytest.raises(lua_table.LuaParseError) as info:
+        list(lua_table.iter_records(io.StringIO(SOURCE)))
+    assert info.value.line == 3
@@ -0,0 +1,50 @@
+import copy
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "python"))
+
+import merge  # noqa: E402
+
+
+def _inputs():
+    rets, rets_digest = merge.load_with_digest(os.path.join(ROOT, "rets.json"))
+    other, other_digest = merge.load_with_digest(os.path.join(ROOT, "other_merged.json"))
+    patch, patch_digest = merge.load_with_digest(os.path.join(ROOT, "custom_patch.json"))
+    return rets, other, patch, {"rets": rets_digest, "other": other_digest, "patch": patch_digest}
+
+
+def test_incremental_run_only_hashes_what_changed(tmp_path, monkeypatch):
+    rets, other, patch, digests = _inputs()
+    state_path = str(tmp_path / "merge_state.json")
+    engine = merge.MergeEngine(state_path)
+    previous, _ = engine.run(rets, other, patch, digests=digests)
+    # 输出文件按键排序写出，读回来的顺序和合并结果不同
+    previous = json.loads(json.dumps(previous, sort_keys=True))
+    engine.files["output"] = "output"
+    engine.save()
+    digests["output"] = "output"
+
+    hashed = []
+    original = merge.skill_hash
+    monkeypatch.setattr(merge, "skill_hash", lambda *v: hashed.append(v) or original(*v))
+
+    engine = merge.MergeEngine(state_path)
+    merged, changeset = engine.run(rets, other, patch, previous=previous, digests=digests)
+    assert engine.recomputed == [] and hashed == []
+    full, full_changeset = merge.MergeEngine(str(tmp_path / "missing.json")).run(rets, other, patch)
+    assert list(merged) == list(full) and merged == full and changeset == full_changeset
+    # 和 merge.py 一样，写出结果后记录输出文件的哈希
+    engine.files["output"] = "output"
+
+    # 只改 rets.json 中的一个技能：只有 rets 的条目需要计算哈希
+    edited = copy.deepcopy(rets)
+    key = next(iter(edited))
+    edited[key]["alternatives"][0]["baseDuration"] += 1
+    hashed.clear()
+    merged, _ = engine.run(edited, other, patch, previous=merged, digests={**digests, "rets": "edited"})
+    assert engine.recomputed == [key]
+    assert len(hashed) <= len(merge.merge_keys(other, patch)) + 2 * len(merge.SOURCES)
+    assert merged == merge.MergeEngine(str(tmp_path / "missing.json")).run(edited, other, patch)[0]
@@ -0,0 +1,132 @@
+import json
+import os
+import re
+import shutil
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "python"))
+
+import bench  # noqa: E402
+import skills  # noqa: E402
+
+
+def test_fetch_add_save_new_from_fixtures(tmp_path, monkeypatch, capsys):
+    # 脚本中的路径都相对于仓库根目录
+    monkeypatch.chdir(ROOT)
+    save_path = tmp_path / "rets.json"
+    with bench.serve_fixtures() as base_url:
+        skills.fetch_add_save_new(
+            save_path=str(save_path),
+            base_url=base_url,
+            rate=None,
+            retries=0,
+            manifest_path=str(tmp_path / "rets_manifest.json"),
+        )
+    out = capsys.readouterr().out
+
+    with open(os.path.join(bench.FIXTURES, "listing.html"), "rb") as f:
+        rows = skills.parse_listing(f.read())
+    served = {
+        row["1"]: row["2"]
+        for row in rows
+        if os.path.exists(os.path.join(bench.FIXTURES, f"skill_{row['2']}.html"))
+    }
+    # 输出按速查表的 (页面, 名称) 排序，没有页面的技能下载失败、不写入
+    expected = [row["2"] for row in sorted(rows, key=lambda r: (r["1"], r["3"])) if row["1"] in served]
+    with open(save_path, "r", encoding="utf-8") as f:
+        rets = json.load(f)
+    assert list(rets) == expected
+
+    with open(bench.RETS, "r", encoding="utf-8") as f:
+        original = json.load(f)
+    for skill_id, skill in rets.items():
+        assert skill == original[skill_id]
+
+    report = re.search(r"速查表共 (\d+) 个技能，下载 (\d+) 个技能页面，([\d.]+) 页/秒，共 (\d+) 字节", out)
+    assert report is not None, out
+    listed, downloaded, throughput, size = report.groups()
+    assert int(listed) == len({(row["1"], row["3"]) for row in rows})
+    assert int(downloaded) == int(listed)
+    assert float(throughput) > 0
+    assert int(size) > 0
+
+
+def test_incremental_run_resolves_stale_ids_again(tmp_path, monkeypatch):
+    monkeypatch.chdir(ROOT)
+    save_path = tmp_path / "rets.json"
+    manifest_path = tmp_path / "rets_manifest.json"
+    with bench.serve_fixtures() as base_url:
+
+        def fetch():
+            skills.fetch_add_save_new(
+                save_path=str(save_path),
+                base_url=base_url,
+                rate=None,
+                retries=0,
+                incremental=True,
+                manifest_path=str(manifest_path),
+            )
+
+        fetch()
+        with open(save_path, "r", encoding="utf-8") as f:
+            expected = json.load(f)
+        # 模拟 name.lua 更新之前的结果：一个技能当时没有找到 id
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        full, entry = next((full, e) for full, e in manifest.items() if e["id"] is not None)
+        stale = f"[Missing] {full}"
+        rets = {stale if k == entry["id"] else k: v for k, v in expected.items()}
+        entry["id"] = stale
+        with open(save_path, "w", encoding="utf-8") as f:
+            json.dump(rets, f, ensure_ascii=False)
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+
+        fetch()
+    with open(save_path, "r", encoding="utf-8") as f:
+        assert json.load(f) == expected
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        assert stale not in {e["id"] for e in json.load(f).values()}
+
+
+def test_incremental_run_keeps_skills_whose_page_failed(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(ROOT)
+    save_path = tmp_path / "rets.json"
+    manifest_path = tmp_path / "rets_manifest.json"
+
+    def fetch(fixtures):
+        with bench.serve_fixtures(fixtures) as base_url:
+            skills.fetch_add_save_new(
+                save_path=str(save_path),
+                base_url=base_url,
+                rate=None,
+                retries=0,
+                incremental=True,
+                manifest_path=str(manifest_path),
+            )
+
+    fetch(bench.FIXTURES)
+    with open(save_path, "r", encoding="utf-8") as f:
+        expected = json.load(f)
+    # 速查表中的一行变了，但这一次它的页面下载失败
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    full, entry = next((full, e) for full, e in manifest.items() if e["id"] is not None)
+    entry["row"] = "changed"
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    fixtures = tmp_path / "fixtures"
+    shutil.copytree(bench.FIXTURES, fixtures)
+    os.remove(fixtures / f"skill_{entry['id']}.html")
+    capsys.readouterr()
+
+    fetch(str(fixtures))
+    out = capsys.readouterr().out
+    assert f"下载失败：{full}" in out
+    assert "删除 0 个已不在速查表中的技能" in out
+    with open(save_path, "r", encoding="utf-8") as f:
+        assert json.load(f) == expected
+    # 清单保留旧的行哈希，下次增量时重新抓取
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        assert json.load(f)[full] == entry
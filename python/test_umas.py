@@ -0,0 +1,37 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from umas import GameDatabase  # noqa: E402
+
+LOAD = "import sys; sys.path.insert(0, sys.argv[1]); from umas import GameDatabase; GameDatabase(*sys.argv[2:])"
+
+
+def test_concurrent_loads_rebuild_the_index_safely(tmp_path):
+    source = tmp_path / "name.lua"
+    shutil.copy(os.path.join(HERE, "name.lua"), source)
+    cache = tmp_path / "name.json"
+    for _ in range(3):
+        # 没有索引时几个进程同时解析并写入同一个索引和 name.json
+        for leftover in (cache, tmp_path / "name.lua.idx"):
+            if leftover.exists():
+                leftover.unlink()
+        procs = [
+            subprocess.Popen(
+                [sys.executable, "-c", LOAD, HERE, str(source), str(cache)],
+                stderr=subprocess.PIPE,
+                text=True,
+            )
+            for _ in range(3)
+        ]
+        for proc in procs:
+            _, err = proc.communicate()
+            assert proc.returncode == 0, err
+    assert not list(tmp_path.glob("*.tmp"))
+    with open(cache, "r", encoding="utf-8") as f:
+        assert len(json.load(f)) == len(GameDatabase(str(source), str(cache)).index_map)
@@ -1,41 +1,94 @@
+import abc
+import argparse
+import contextlib
+import hashlib
 import json
+import pickle
 import re
 import os
+import threading
 
-from bs4 import BeautifulSoup
-import requests
+import artifacts
+import html_extract
+import lua_table
+import metrics
+from fetcher import Fetcher
+from http_cache import HttpCache
+from name_resolver import LANGS, NameResolver
+
+
+def iter_records(source_path: str):
+    """逐条读取 name.lua，只返回带 category、index、text_CN 的记录"""
+    with open(source_path, "r", encoding="utf-8") as f:
+        for item in lua_table.iter_records(f, on_error=_warn_malformed):
+            if "index" in item and "text_CN" in item and "category" in item:
+                yield item
+
+
+def _warn_malformed(error: lua_table.LuaParseError):
+    print(f"[Warning] Malformed record: {error}")
+    metrics.count("name_table.malformed")
+
+
+def source_signature(source_path: str) -> tuple[int, int]:
+    st = os.stat(source_path)
+    return st.st_size, st.st_mtime_ns
+
+
+def source_hash(source_path: str) -> str:
+    with open(source_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+# 预建索引格式变化时加一，旧索引会被自动重建
+INDEX_VERSION = 1
+INDEX_KEYS = ("version", "stat", "sha256", "index_map", "reverse_map")
+
+
+@contextlib.contextmanager
+def _atomic_open(path: str, mode: str, **kwargs):
+    """先写入本进程、本线程独有的临时文件，成功后再替换 path
+
+    多个脚本同时加载 GameDatabase（build.py 并行运行各阶段）时各写各的临时文件，
+    不会互相改名走对方的文件，其它进程也不会读到写了一半的内容。
+    """
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, mode, **kwargs) as f:
+            yield f
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
 
 
 class GameDatabase:
-    def __init__(self, source_path: str, cache_path: str = "namedict.json"):
+    def __init__(
+        self,
+        source_path: str,
+        cache_path: str = "namedict.json",
+        index_path: str | None = None,
+    ):
         self.source_path = source_path
         self.cache_path = cache_path
+        # 二进制预建索引，保存 index_map 和 reverse_map
+        self.index_path = index_path or source_path + ".idx"
         self.index_map = {}  # type:ignore
-        self._build_cache()
-
-    def _parse_line_to_dict(self, line: str) -> dict | None:
-        try:
-            pattern = re.compile(r'(\w+)=["\'](.*?)["\'](?=[,}])')
-            pairs = pattern.findall(line)
-            return dict(pairs) if pairs else None
-        except:
-            return None
+        self._resolver = None
+        if self._load_cache():
+            metrics.count("name_table.index_hit")
+        else:
+            with metrics.span("name_table.parse"):
+                self._build_cache()
+            self._save_cache()
 
     def _build_cache(self):
-        with open(self.source_path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip(",\n ")
-                if not line or "{" not in line:
-                    continue
-                item = self._parse_line_to_dict(line)
-                if item is None:
-                    continue
-                if "index" in item and "text_CN" in item and "category" in item:
-                    key = f"{item['category']}_{item['index']}"
-                    if key in self.index_map:
-                        print(f"[Warning] Duplicate index: {key}")
-                    else:
-                        self.index_map[key] = item
+        for item in iter_records(self.source_path):
+            key = f"{item['category']}_{item['index']}"
+            if key in self.index_map:
+                print(f"[Warning] Duplicate index: {key}")
+            else:
+                self.index_map[key] = item
 
         self.reverse_map = {}
         # 建立反向索引
@@ -48,12 +101,51 @@ class GameDatabase:
             if cat and name and idx:
                 self.reverse_map[(cat, name)] = idx
 
-        with open(self.cache_path, "w", encoding="utf-8") as f:
+        with _atomic_open(self.cache_path, "w", encoding="utf-8") as f:
             json.dump(self.index_map, f, ensure_ascii=False, indent=2)
 
-    def _load_cache(self):
-        with open(self.cache_path, "r", encoding="utf-8") as f:
-            self.index_map = json.load(f)
+    def _load_cache(self) -> bool:
+        """加载预建索引，源文件大小、修改时间和哈希都对不上时返回 False
+
+        索引文件损坏、被截断或者是其它版本写的（反序列化可能抛出任何异常）时同样返回 False，
+        由调用方重新解析 name.lua。
+        """
+        try:
+            with open(self.index_path, "rb") as f:
+                cached = pickle.load(f)
+        except Exception:
+            return False
+        if not isinstance(cached, dict) or any(key not in cached for key in INDEX_KEYS):
+            return False
+        if cached["version"] != INDEX_VERSION:
+            return False
+        if not isinstance(cached["index_map"], dict) or not isinstance(cached["reverse_map"], dict):
+            return False
+        stat = source_signature(self.source_path)
+        if not isinstance(cached["stat"], (tuple, list)) or tuple(cached["stat"]) != stat:
+            # 只是修改时间变了（比如 git checkout），内容相同时不用重建
+            if cached["sha256"] != source_hash(self.source_path):
+                return False
+            cached["stat"] = stat
+            self._write_index(cached)
+        self.index_map = cached["index_map"]
+        self.reverse_map = cached["reverse_map"]
+        return True
+
+    def _save_cache(self):
+        self._write_index(
+            {
+                "version": INDEX_VERSION,
+                "stat": source_signature(self.source_path),
+                "sha256": source_hash(self.source_path),
+                "index_map": self.index_map,
+                "reverse_map": self.reverse_map,
+            }
+        )
+
+    def _write_index(self, cached: dict):
+        with _atomic_open(self.index_path, "wb") as f:
+            pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
 
     def get_name(self, category: str, index: str) -> str:
         """传入 category 和 index，返回 text_CN 中文名"""
@@ -70,69 +162,214 @@ class GameDatabase:
             idx = "9" + idx[1:]
         return idx
 
-    def create_umas_json(self, output_path="umas.json"):
-        result = {}
+    @property
+    def resolver(self) -> NameResolver:
+        """模糊匹配索引，第一次使用时建立"""
+        if self._resolver is None:
+            self._resolver = NameResolver(self.index_map.values())
+        return self._resolver
 
-        for key, data in self.index_map.items():
-            uma_id = str(data["index"][:4])
-            if int(data["category"]) != 4:
-                continue
-            match = re.match(r"(\[.*?\])(.*)", data["text_CN"])
-            if not match:
-                continue
-            outfit_name_jp = match.group(1)  # [スペシャルドリーマー]
-            char_name_jp = match.group(2)  # スペシャルウィーク
-
-            if uma_id not in result:
-                result[uma_id] = {
-                    "name": [
-                        char_name_jp,
-                    ],
-                    "outfits": {},
-                }
-
-            result[uma_id]["outfits"][data["index"]] = outfit_name_jp
-
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(result, f, ensure_ascii=False, indent=4)
-
-    def create_skill_names_json(self, output_path="skillnames.json"):
-        result = {}
+    def find_id(self, category: str, name: str, inherit=False):
+        """先精确查找，找不到时按规范化后的名称查找；返回 (index, 规范化匹配的候选或 None)"""
+        idx = self.get_id(category, name, inherit)
+        if not idx.startswith("[Missing]"):
+            return idx, None
+        candidate = self.resolver.resolve(category, name)
+        if candidate is None:
+            return idx, None
+        idx = candidate.index
+        if inherit:
+            idx = "9" + idx[1:]
+        return idx, candidate
+
+    def create_outputs(self, output_dir=".", emitters=None, langs=LANGS) -> dict:
+        """遍历一次 index_map，把各行按 category 分发给 emitter，写出所有语言的文件
+
+        返回 {文件路径: 条目数}。emitters 默认为 EMITTERS 中的全部类型。
+        """
+        if emitters is None:
+            emitters = [cls(langs) for cls in EMITTERS]
+        by_category = {}
+        for emitter in emitters:
+            by_category.setdefault(emitter.category, []).append(emitter)
+
+        # category 在 name.lua 中就是字符串，直接按字符串分发，不用逐行转换
+        for data in self.index_map.values():
+            handlers = by_category.get(data["category"])
+            if handlers:
+                for emitter in handlers:
+                    emitter.add(data)
+
+        os.makedirs(output_dir, exist_ok=True)
+        written = {}
+        for emitter in emitters:
+            for lang, result in emitter.results.items():
+                path = os.path.join(output_dir, emitter.filename(lang))
+                artifacts.emit(result, path)
+                written[path] = len(result)
+        return written
+
+    def create_umas_json(self, output_path="umas.json", lang="CN"):
+        self._create_single(UmasEmitter, output_path, lang)
+
+    def create_skill_names_json(self, output_path="skillnames.json", lang="CN"):
+        self._create_single(SkillNamesEmitter, output_path, lang)
+
+    def _create_single(self, cls, output_path, lang):
+        emitter = cls((lang,))
+        for data in self.index_map.values():
+            if data["category"] == emitter.category:
+                emitter.add(data)
+        artifacts.emit(emitter.results[lang], output_path)
 
-        for key, data in self.index_map.items():
-            skill_id = str(data["index"])
-            if int(data["category"]) != 47:
-                continue
-            name = data["text_CN"]
-            if not name:
-                name = data["text_TW"]
-            if not name:
-                name = data["text_JP"]
 
-            if not data["text_CN"]:
-                name = f"[未实装] {name}"
-            if skill_id[0] == "9":
-                name += " (继承)"
-            result[skill_id] = [name]
+def localized(data: dict, lang: str) -> str:
+    """优先取 lang 的文本，没有时按 CN、TW、JP 的顺序找一个有文本的语言"""
+    for fallback in (lang, *LANGS):
+        text = data.get(f"text_{fallback}")
+        if text:
+            return text
+    return ""
 
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(result, f, ensure_ascii=False, indent=4)
+
+class Emitter(abc.ABC):
+    """按语言生成一个名称文件
+
+    category 为处理的 name.lua 分类，add 对每一行调用一次，结果按语言保存在 results 中。
+    CN 的文件名为 stem.json，其它语言为 stem.<语言>.json。
+    """
+
+    category = ""
+    stem = ""
+
+    def __init__(self, langs=LANGS):
+        self.results = {lang: {} for lang in langs}
+
+    def filename(self, lang: str) -> str:
+        return f"{self.stem}.json" if lang == "CN" else f"{self.stem}.{lang}.json"
+
+    def add(self, data: dict):
+        for lang, result in self.results.items():
+            self.add_locale(result, data, lang)
+
+    @abc.abstractmethod
+    def add_locale(self, result: dict, data: dict, lang: str):
+        """把 name.lua 的一行按 lang 写入 result"""
+
+
+class UmasEmitter(Emitter):
+    """{角色 id: {"name": [角色名], "outfits": {决胜服 id: "[决胜服名]"}}}"""
+
+    category = "4"
+    stem = "umas"
+
+    def add_locale(self, result, data, lang):
+        match = re.match(r"(\[.*?\])(.*)", data.get(f"text_{lang}") or "")
+        if not match:
+            return
+        outfit_name = match.group(1)  # [特别追梦者]
+        char_name = match.group(2)  # 特别周
+        uma_id = data["index"][:4]
+        if uma_id not in result:
+            result[uma_id] = {"name": [char_name], "outfits": {}}
+        result[uma_id]["outfits"][data["index"]] = outfit_name
+
+
+class SkillNamesEmitter(Emitter):
+    """{技能 id: [技能名]}，该语言没有文本时用其它语言并标记为未实装"""
+
+    category = "47"
+    stem = "skillnames"
+
+    UNRELEASED = {"CN": "[未实装] ", "TW": "[未實裝] ", "JP": "[未実装] "}
+    INHERITED = {"CN": " (继承)", "TW": " (繼承)", "JP": " (継承)"}
+
+    def add_locale(self, result, data, lang):
+        skill_id = data["index"]
+        name = localized(data, lang)
+        if not data.get(f"text_{lang}"):
+            name = self.UNRELEASED[lang] + name
+        if skill_id[0] == "9":
+            name += self.INHERITED[lang]
+        result[skill_id] = [name]
+
+
+class NameEmitter(Emitter):
+    """{index: [名称]}，去掉 suffixes 中的后缀；所有语言都没有文本的行跳过"""
+
+    suffixes = ()
+
+    def add_locale(self, result, data, lang):
+        name = localized(data, lang)
+        if not name:
+            return
+        for suffix in self.suffixes:
+            if name.endswith(suffix) and name != suffix:
+                name = name[: -len(suffix)]
+                break
+        result[data["index"]] = [name]
+
+
+class RacetrackNamesEmitter(NameEmitter):
+    # tracknames.json 是手工维护的 [日, 英, 中] 格式，这里单独输出，不覆盖
+    category = "31"
+    stem = "racetracks"
+    suffixes = ("赛场", "賽場", "レース場")
+
+
+class CharaNamesEmitter(NameEmitter):
+    category = "6"
+    stem = "charanames"
+
+
+class RaceNamesEmitter(NameEmitter):
+    category = "38"
+    stem = "racenames"
+
+
+EMITTERS = [UmasEmitter, SkillNamesEmitter, RacetrackNamesEmitter, CharaNamesEmitter, RaceNamesEmitter]
 
 
 # 🧪 示例用法
 if __name__ == "__main__":
-    url = "https://wiki.biligame.com/umamusume/%E6%A8%A1%E5%9D%97:%E7%BF%BB%E8%AF%91%E6%95%B0%E6%8D%AE%E5%BA%93"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36 Edg/138.0.0.0",
-        "Accept-Language": "zh-CN,zh;q=0.9",
-    }
-    response = requests.get(url, headers=headers)
-    soup = BeautifulSoup(response.text, "html.parser")
-
-    pre = soup.find("pre", class_="mw-code mw-script", dir="ltr")
-    text_copy = pre.get_text()
-    with open("python/name.lua", "w", encoding="utf-8") as f:
-        f.write(text_copy)
-    db = GameDatabase("python/name.lua", "name.json")
-    db.create_umas_json(output_path="umalator-cn/umas.json")
-    db.create_skill_names_json(output_path="umalator-cn/skillnames.json")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cache-dir", default=".http_cache", help="响应缓存目录，空字符串为不缓存")
+    parser.add_argument("--ttl", type=float, default=24 * 3600, help="缓存在多少秒内不重新验证")
+    parser.add_argument("--offline", action="store_true", help="只用缓存，不访问网络")
+    parser.add_argument("--skip-download", action="store_true", help="直接使用现有的 name.lua")
+    parser.add_argument(
+        "--index-only", action="store_true", help="只建立 name.lua 的预建索引和 name.json，不生成名称文件"
+    )
+    parser.add_argument("--output-dir", default="umalator-cn")
+    parser.add_argument(
+        "--langs", nargs="+", default=list(LANGS), choices=LANGS, help="生成哪些语言的名称文件"
+    )
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+
+    with metrics.run("umas", args.metrics, args.profile):
+        if not args.skip_download:
+            url = "https://wiki.biligame.com/umamusume/%E6%A8%A1%E5%9D%97:%E7%BF%BB%E8%AF%91%E6%95%B0%E6%8D%AE%E5%BA%93"
+            cache = (
+                HttpCache(args.cache_dir, ttl=args.ttl, offline=args.offline)
+                if args.cache_dir
+                else None
+            )
+            with metrics.span("download"), Fetcher(cache=cache) as fetcher:
+                content = fetcher.get(url)
+            with metrics.span("extract"):
+                text_copy = html_extract.find_text(
+                    content, "pre", {"class": "mw-code mw-script", "dir": "ltr"}
+                )
+            with open("python/name.lua", "w", encoding="utf-8") as f:
+                f.write(text_copy)
+        with metrics.span("name_table"):
+            db = GameDatabase("python/name.lua", "name.json")
+        if args.index_only:
+            print(f"{db.index_path}: {len(db.index_map)} 条")
+            raise SystemExit(0)
+        with metrics.span("write"):
+            written = db.create_outputs(args.output_dir, langs=args.langs)
+        for path, n in written.items():
+            metrics.count("names.written", n)
+            print(f"{path}: {n} 条")
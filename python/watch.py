@@ -0,0 +1,231 @@
+"""常驻的 watch 模式：输入文件变化时只重新处理受影响的技能和赛道
+
+启动时把 name.lua、国服技能数据、上游 skill_data、custom_patch 和赛道数据读入内存并完整
+合并一次，之后每隔 interval 秒检查各输入文件的大小和修改时间。文件变化时重新读取这个文件，
+和内存中的上一版逐条比较，只对变化的技能调用 MergeEngine.update、只对变化的赛道重新计算
+坡道，再写出输出文件。
+
+    python python/watch.py --upstream other_merged.json
+
+手工修改 custom_patch.json 或 rets.json 后通常几十毫秒内就能写出新的 skill_data.json。
+"""
+
+import argparse
+import copy
+import json
+import os
+import time
+
+import artifacts
+import course_pack
+import merge
+import slope
+from umas import GameDatabase
+
+
+def _stat(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def _load(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def changed_keys(old: dict, new: dict) -> set:
+    """两版数据中新增、删除或内容不同的条目"""
+    return {key for key in old.keys() | new.keys() if old.get(key) != new.get(key)}
+
+
+class FileWatcher:
+    """轮询文件的大小和修改时间"""
+
+    def __init__(self, paths):
+        self.stats = {path: _stat(path) for path in paths}
+
+    def poll(self) -> list[str]:
+        changed = []
+        for path, old in self.stats.items():
+            stat = _stat(path)
+            if stat != old:
+                self.stats[path] = stat
+                changed.append(path)
+        return changed
+
+
+class SkillWatch:
+    """技能数据：rets.json、上游 skill_data、custom_patch 任意一个变化时增量合并"""
+
+    def __init__(self, args):
+        self.args = args
+        self.paths = {"rets": args.rets, "other": args.upstream, "patch": args.patch}
+        self.name_path = args.names
+        self.db = GameDatabase(args.names, os.devnull)
+        self.inputs = {name: _load(path) for name, path in self.paths.items()}
+        self.engine = merge.MergeEngine(args.state)
+        self.engine.state = {}
+        self.merged, changeset = self.engine.run(
+            self.inputs["rets"],
+            self.inputs["other"],
+            self.inputs["patch"],
+            name_of=self.name_of,
+        )
+        self.write(changeset)
+
+    def name_of(self, key: str) -> str:
+        return self.db.get_name(category="47", index=key)
+
+    @property
+    def watched(self) -> list[str]:
+        return [*self.paths.values(), self.name_path]
+
+    def handle(self, paths: list[str]) -> str | None:
+        """处理变化的文件，返回一行说明；和技能无关时返回 None"""
+        if self.name_path in paths:
+            # 名称只影响变更集里的 name 字段
+            self.db = GameDatabase(self.name_path, os.devnull)
+        keys = set()
+        for name, path in self.paths.items():
+            if path not in paths:
+                continue
+            try:
+                data = _load(path)
+            except (OSError, json.JSONDecodeError) as e:
+                # 编辑器保存到一半时可能读到不完整的文件，等下一次变化
+                print(f"[Warning] 无法读取 {path}：{e}")
+                continue
+            keys |= changed_keys(self.inputs[name], data)
+            self.inputs[name] = data
+        if not keys and self.name_path not in paths:
+            return None
+
+        other, patch = self.inputs["other"], self.inputs["patch"]
+        self.merged = self.engine.update(
+            sorted(keys), self.inputs["rets"], other, patch, self.merged, self.name_of
+        )
+        changeset = self.engine.changeset(merge.merge_keys(other, patch), patch, self.name_of)
+        self.write(changeset)
+        for f in changeset["changes"]:
+            if f["key"] in keys and f["kind"] in ("failure", "invalid_condition", "unknown_variable"):
+                print(f"[Warning] {json.dumps(f, ensure_ascii=False)}")
+        return f"重新合并 {len(self.engine.recomputed)} 个技能：{', '.join(sorted(keys)) or '-'}"
+
+    def write(self, changeset: dict):
+        artifacts.emit(self.merged, self.args.output, report=False)
+        with open(self.args.changes, "w", encoding="utf-8") as f:
+            json.dump(changeset, f, ensure_ascii=False, indent=2)
+
+    def close(self):
+        self.engine.save()
+
+
+class CourseWatch:
+    """赛道数据：只重新计算基础数据或高度数据变化的赛道的坡道"""
+
+    def __init__(self, args):
+        self.args = args
+        self.input_path = args.courses
+        self.points_path = args.points
+        self.courses = _load(self.input_path)
+        self.points = _load(self.points_path)
+        self.output = slope.fill_course_slopes(copy.deepcopy(self.courses), self.points)
+        self.write()
+
+    @property
+    def watched(self) -> list[str]:
+        return [self.input_path, self.points_path]
+
+    def _track_points(self, points: dict, course_id: str, course: dict):
+        track = points.get(str(course.get("raceTrackId")), {})
+        return track.get("courses", {}).get(course_id)
+
+    def handle(self, paths: list[str]) -> str | None:
+        courses, points = self.courses, self.points
+        try:
+            if self.input_path in paths:
+                courses = _load(self.input_path)
+            if self.points_path in paths:
+                points = _load(self.points_path)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"[Warning] 无法读取赛道数据：{e}")
+            return None
+
+        ids = changed_keys(self.courses, courses)
+        if points is not self.points:
+            ids |= {
+                course_id
+                for course_id, course in courses.items()
+                if self._track_points(self.points, course_id, course)
+                != self._track_points(points, course_id, course)
+            }
+        self.courses, self.points = courses, points
+        if not ids:
+            return None
+
+        subset = {cid: copy.deepcopy(courses[cid]) for cid in ids if cid in courses}
+        slope.fill_course_slopes(subset, points)
+        output = {}
+        for course_id in courses:
+            output[course_id] = subset.get(course_id, self.output.get(course_id))
+        self.output = output
+        self.write()
+        return f"重新计算 {len(ids)} 条赛道：{', '.join(sorted(ids))}"
+
+    def write(self):
+        artifacts.emit(self.output, self.args.course_output, report=False)
+        if self.args.pack:
+            course_pack.write_pack(self.output, self.args.pack)
+
+
+def watch(handlers, interval: float):
+    watcher = FileWatcher([path for h in handlers for path in h.watched])
+    print(f"[watch] 正在监视 {len(watcher.stats)} 个文件，Ctrl+C 退出")
+    try:
+        while True:
+            time.sleep(interval)
+            changed = watcher.poll()
+            if not changed:
+                continue
+            start = time.perf_counter()
+            messages = [m for h in handlers if (m := h.handle(changed))]
+            elapsed = (time.perf_counter() - start) * 1000
+            for message in messages:
+                print(f"[watch] {message}（{elapsed:.0f} ms）")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for h in handlers:
+            if hasattr(h, "close"):
+                h.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="监视输入文件，变化时增量更新 umalator-cn 的数据")
+    parser.add_argument("--names", default="python/name.lua")
+    parser.add_argument("--rets", default="rets.json")
+    parser.add_argument("--upstream", default="uma-skill-tools/data/skill_data.json")
+    parser.add_argument("--patch", default="custom_patch.json")
+    parser.add_argument("--output", default="umalator-cn/skill_data.json")
+    parser.add_argument("--changes", default="merge_changes.json")
+    parser.add_argument("--state", default="merge_state.json", help="退出时写入增量合并状态")
+    parser.add_argument("--courses", default="course_data_normal.json")
+    parser.add_argument("--points", default="course_data_slope.json")
+    parser.add_argument("--course-output", default="umalator-cn/course_data.json")
+    parser.add_argument("--pack", default="course_data.pack", help="空字符串为不生成")
+    parser.add_argument("--no-courses", action="store_true", help="只监视技能数据")
+    parser.add_argument("--interval", type=float, default=0.2, help="检查文件的间隔（秒）")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    handlers = [SkillWatch(args)]
+    if not args.no_courses:
+        if os.path.exists(args.courses) and os.path.exists(args.points):
+            handlers.append(CourseWatch(args))
+        else:
+            print(f"[Warning] 找不到 {args.courses} 或 {args.points}，不监视赛道数据")
+    print(f"[watch] 初始化完成，耗时 {time.perf_counter() - start:.2f}s")
+    watch(handlers, args.interval)
@@ -1,25 +1,14 @@
-import json
+import sys
 
-# 假设你的 JSON 文件叫 rets.json
-with open("uma-skill-tools\data\skill_data.json", "r", encoding="utf-8") as f:
-    data = json.load(f)
+sys.path.insert(0, "python")
 
-all_targets = set()
-target_type_map = {}
+from skill_table import SkillTable  # noqa: E402
 
-for skill_id, skill_data in data.items():
-    for alt in skill_data.get("alternatives", []):
-        for effect in alt.get("effects", []):
-            target = effect.get("target")
-            type_ = effect.get("type")
-            if target is not None:
-                all_targets.add(target)
-                if target not in target_type_map:
-                    target_type_map[target] = set()
-                if type_ is not None:
-                    target_type_map[target].add(type_)
+# 假设你的 JSON 文件叫 rets.json
+table = SkillTable.load(sys.argv[1] if len(sys.argv) > 1 else "uma-skill-tools/data/skill_data.json")
+table = table.filter(target=(">=", 0))
 
-print("不同的 target 值:", all_targets)
+print("不同的 target 值:", set(table.unique("target")))
 print("\n每个 target 下出现的 type 种类:")
-for target, types in target_type_map.items():
-    print(f"Target {target}: {types}")
+for target, group in table.group_by("target").items():
+    print(f"Target {target}: {set(group.unique('type'))}")